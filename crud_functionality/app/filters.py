@@ -0,0 +1,54 @@
+"""
+Catalogue search for the Book API.
+
+``?isbn=`` matches the normalized ISBN column, so ISBN-10s and hyphenated
+numbers find their book; ``?title=``, ``?author=`` and ``?search=`` (either of
+the two) are case-insensitive prefix matches. Prefixes are turned into a range
+on the folded ``title_key``/``author_key`` columns (``key >= 'war' AND key <
+'war\\U0010ffff'``), which every backend answers from the plain B-tree index,
+unlike ``LIKE``/``ILIKE``. Ordering by title or author uses the same columns.
+"""
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from app.isbn import normalize_isbn, search_key
+
+# Sorts after every character a key can contain.
+PREFIX_END = '\U0010ffff'
+
+
+def prefix_filter(field, prefix):
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_END})
+
+
+class BookSearchFilter(BaseFilterBackend):
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('isbn'):
+            raw = params['isbn']
+            queryset = queryset.filter(isbn_normalized=normalize_isbn(raw) or raw.replace('-', '').strip())
+        for param, field in (('title', 'title_key'), ('author', 'author_key')):
+            prefix = search_key(params.get(param))
+            if prefix:
+                queryset = queryset.filter(prefix_filter(field, prefix))
+        term = search_key(params.get('search'))
+        if term:
+            queryset = queryset.filter(prefix_filter('title_key', term) | prefix_filter('author_key', term))
+        return queryset
+
+
+class BookOrderingFilter(OrderingFilter):
+    """
+        ``?ordering=title`` / ``author`` sort on the indexed folded columns.
+    """
+    indexed_columns = {'title': 'title_key', 'author': 'author_key'}
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [
+            ('-' if name.startswith('-') else '') + self.indexed_columns.get(name.lstrip('-'), name.lstrip('-'))
+            for name in ordering
+        ]
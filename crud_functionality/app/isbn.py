@@ -0,0 +1,49 @@
+"""
+ISBN normalization.
+
+Books are looked up by the ISBN-13 form of their number: ISBN-10s get the
+``978`` prefix and a recomputed check digit, and hyphens and spaces are
+dropped, so ``0-306-40615-2``, ``0306406152`` and ``978-0-306-40615-7`` all
+find the same book.
+"""
+import re
+
+_SEPARATORS = re.compile(r'[\s-]')
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_is_valid(isbn):
+    digits = [10 if char == 'X' else int(char) for char in isbn]
+    return sum(weight * digit for weight, digit in zip(range(10, 0, -1), digits)) % 11 == 0
+
+
+def normalize_isbn(value):
+    """
+        Converts an ISBN-10 or ISBN-13, with or without separators, to ISBN-13 digits.
+
+        Args:
+            value (str): The ISBN as entered.
+
+        Returns:
+            str: 13 digits, or ``None`` when ``value`` is not a valid ISBN.
+    """
+    isbn = _SEPARATORS.sub('', str(value or '')).upper()
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        if not _isbn10_is_valid(isbn):
+            return None
+        first12 = '978' + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+    if len(isbn) == 13 and isbn.isdigit() and isbn[12] == _isbn13_check_digit(isbn[:12]):
+        return isbn
+    return None
+
+
+def search_key(value):
+    """
+        Folds a title or author for case-insensitive prefix search.
+    """
+    return ' '.join(str(value or '').split()).casefold()
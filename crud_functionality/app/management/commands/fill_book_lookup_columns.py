@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Book
+
+LOOKUP_FIELDS = ['isbn_normalized', 'title_key', 'author_key']
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the derived lookup columns (isbn_normalized, title_key, author_key) of existing books, '
+        'e.g. after they were added or after changing how ISBNs and names are normalized.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        seen = updated = 0
+        last_pk = None
+        while True:
+            books = Book.objects.order_by('pk').only('isbn', 'title', 'author', *LOOKUP_FIELDS)
+            if last_pk is not None:
+                books = books.filter(pk__gt=last_pk)
+            books = list(books[:batch_size])
+            if not books:
+                break
+            stale = []
+            for book in books:
+                before = [getattr(book, name) for name in LOOKUP_FIELDS]
+                book.fill_lookup_columns()
+                if [getattr(book, name) for name in LOOKUP_FIELDS] != before:
+                    stale.append(book)
+            with transaction.atomic():
+                Book.objects.bulk_update(stale, LOOKUP_FIELDS, batch_size=batch_size)
+            seen += len(books)
+            updated += len(stale)
+            last_pk = books[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'{seen} books checked, {updated} updated.'))
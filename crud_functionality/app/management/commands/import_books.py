@@ -0,0 +1,47 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importers import decode_lines, import_books, iter_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Upserts books from a CSV or NDJSON file by normalized ISBN-13. Columns: isbn, title, author, '
+        'published_date (YYYY-MM-DD).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--report', help='Write the outcome of every row (row, isbn, status, error) to this CSV file.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or path.rsplit('.', 1)[-1].lower()
+        try:
+            with open(path, 'rb') as handle:
+                report = import_books(
+                    iter_rows(decode_lines(handle), file_format),
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(error)
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['row', 'isbn', 'status', 'error'])
+                writer.writerows(report.rows)
+        rejected = [(line, error) for line, _, outcome, error in report.rows if outcome == 'rejected']
+        for line, error in rejected[:20]:
+            self.stderr.write(f'row {line}: {error}')
+
+        summary = report.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['read']} rows read, {summary['created']} books created, {summary['updated']} updated, "
+            f"{summary['duplicates']} duplicates, {summary['rejected']} rejected in {report.seconds:.2f}s "
+            f'({report.rows_per_second:.0f} rows/s)' + (' [dry run]' if options['dry_run'] else '')
+        ))
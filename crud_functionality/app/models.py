@@ -1,10 +1,32 @@
 from django.db import models
 
+from app.isbn import normalize_isbn, search_key
+
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=100)
     published_date = models.DateField()
     isbn = models.CharField(max_length=13, unique=True)
 
+    # Derived lookup columns, kept in sync by fill_lookup_columns(); existing rows are
+    # backfilled with the fill_book_lookup_columns command. Two spellings of one ISBN are
+    # one book, so the normalized ISBN is unique and is the key imports upsert on.
+    isbn_normalized = models.CharField(max_length=13, unique=True, editable=False)
+    title_key = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    author_key = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
+
     def __str__(self):
         return self.title
+
+    def fill_lookup_columns(self):
+        self.isbn_normalized = normalize_isbn(self.isbn) or self.isbn
+        self.title_key = search_key(self.title)
+        self.author_key = search_key(self.author)
+
+    def save(self, *args, **kwargs):
+        self.fill_lookup_columns()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'isbn_normalized', 'title_key', 'author_key'}
+        super().save(*args, **kwargs)
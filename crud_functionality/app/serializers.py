@@ -1,7 +1,19 @@
 from rest_framework import serializers
+
+from crud_functionality.fieldsets import SparseFieldsetsMixin
+from .isbn import normalize_isbn
 from .models import Book
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
-        fields = '__all__'
+        exclude = ['isbn_normalized', 'title_key', 'author_key']
+
+    def validate_isbn(self, value):
+        # Another spelling of a stored ISBN would break the unique isbn_normalized column.
+        books = Book.objects.filter(isbn_normalized=normalize_isbn(value) or value)
+        if self.instance is not None:
+            books = books.exclude(pk=self.instance.pk)
+        if books.exists():
+            raise serializers.ValidationError('A book with this ISBN already exists.')
+        return value
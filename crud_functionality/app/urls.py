@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import BookListCreateAPIView, BookRetrieveUpdateDestroyAPIView
+from .views import BookImportAPIView, BookListCreateAPIView, BookRetrieveUpdateDestroyAPIView
 
 urlpatterns = [
     path('books/', BookListCreateAPIView.as_view(), name='book-list-create'),
+    path('books/import/', BookImportAPIView.as_view(), name='book-import'),
     path('books/<int:pk>/', BookRetrieveUpdateDestroyAPIView.as_view(), name='book-detail'),
 ]
@@ -1,11 +1,66 @@
-from rest_framework import generics
+import csv
+
+from rest_framework import generics, status
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from crud_functionality.fieldsets import SparseFieldsetsViewMixin
+from crud_functionality.filters import FieldFilterBackend
+from crud_functionality.routers import ReplicaReadMixin
+from referral_system_database.idempotency import IdempotentWriteMixin
+from .filters import BookOrderingFilter, BookSearchFilter
+from .importers import CONTENT_TYPES, decode_lines, import_books, iter_rows
 from .models import Book
 from .serializers import BookSerializer
 
-class BookListCreateAPIView(generics.ListCreateAPIView):
+class BookListCreateAPIView(IdempotentWriteMixin, SparseFieldsetsViewMixin, ReplicaReadMixin, generics.ListCreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    filter_backends = [FieldFilterBackend, BookSearchFilter, BookOrderingFilter]
+    filter_fields = {
+        'published_date': ['exact', 'gte', 'lte'],
+    }
+    ordering_fields = ['id', 'title', 'author', 'published_date']
+    ordering = ['id']
 
-class BookRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class BookRetrieveUpdateDestroyAPIView(
+    IdempotentWriteMixin, SparseFieldsetsViewMixin, ReplicaReadMixin, generics.RetrieveUpdateDestroyAPIView,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+
+
+class BookImportAPIView(APIView):
+    """
+        Upserts books from a CSV or NDJSON request body, read as a stream.
+
+        The body's ``Content-Type`` picks the format (``text/csv`` or
+        ``application/x-ndjson``); ``?batch_size=`` and ``?dry_run=true`` are
+        optional. Responds with the counts, the throughput and every row's outcome.
+    """
+
+    def post(self, request):
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type not in CONTENT_TYPES:
+            raise UnsupportedMediaType(content_type)
+        try:
+            batch_size = min(max(int(request.query_params.get('batch_size', 1000)), 1), 5000)
+        except ValueError:
+            raise ParseError('batch_size must be an integer.')
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+        # The Django request iterates over body lines without buffering the whole upload.
+        rows = iter_rows(decode_lines(request.stream or []), CONTENT_TYPES[content_type])
+        try:
+            report = import_books(rows, batch_size=batch_size, dry_run=dry_run)
+        except (UnicodeDecodeError, csv.Error) as error:
+            raise ParseError(str(error))
+        return Response({
+            **report.summary(),
+            'dry_run': dry_run,
+            'rows': [
+                {'row': line, 'isbn': isbn, 'status': outcome, 'error': error}
+                for line, isbn, outcome, error in report.rows
+            ],
+        }, status=status.HTTP_200_OK)
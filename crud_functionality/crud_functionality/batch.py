@@ -0,0 +1,184 @@
+"""
+Batch endpoint: several API calls in one HTTP round trip.
+
+``POST /batch/`` takes ``{"requests": [{"id": ..., "method": "GET", "path":
+"/referral_system_database/hospitals/?district=...", "body": {...}}, ...],
+"parallel": true}`` and answers ``{"responses": [{"id", "status", "headers",
+"body"}, ...]}`` in the same order.
+
+Sub-requests are resolved with the project's URLconf and handed straight to
+their views, skipping the HTTP stack, so only DRF views can be called. The caller is authenticated once for the
+batch and every sub-request reuses that user and token. Runs of consecutive
+``GET`` sub-requests are dispatched on a thread pool when ``parallel`` is set
+(each thread on its own database connection); writes always run one at a time,
+in order, so a read placed after a write sees it.
+"""
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import LimitedStream
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Outer request headers that must not leak into sub-requests. The batch's
+# Idempotency-Key would otherwise be claimed by its first write and make every
+# later one a key reuse.
+DROPPED_META = {
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH', 'HTTP_IDEMPOTENCY_KEY', 'wsgi.input',
+}
+
+# Sub-response headers worth returning to the client.
+RETURNED_HEADERS = ('Content-Type', 'Location', 'ETag', 'Last-Modified', 'X-Cache', 'Retry-After')
+
+PARALLEL_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class BatchItemSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, max_length=100)
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.RegexField(r'^/', max_length=2000)
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(default=True)
+
+    def validate_requests(self, value):
+        limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} requests per batch.')
+        return value
+
+
+def build_request(outer, item):
+    """
+        Builds the ``HttpRequest`` for one sub-request, authenticated as ``outer``.
+
+        Args:
+            outer (Request): The batch request.
+            item (dict): Validated ``BatchItemSerializer`` data.
+    """
+    path, _, query = item['path'].partition('?')
+    body = json.dumps(item['body']).encode() if 'body' in item else b''
+    request = HttpRequest()
+    request.method = item['method']
+    request.path = request.path_info = path
+    request.META = {key: value for key, value in outer._request.META.items() if key not in DROPPED_META}
+    request.META.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+    })
+    request.GET = QueryDict(query)
+    request.COOKIES = outer._request.COOKIES
+    request._stream = LimitedStream(BytesIO(body), len(body))
+    request._read_started = False
+    # DRF's forced authentication: the batch's user and token, without re-validating.
+    request._force_auth_user = outer.user
+    request._force_auth_token = outer.auth
+    return request
+
+
+def _response_body(response):
+    content = response.content
+    if not content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(content)
+    return content.decode(response.charset or 'utf-8', errors='replace')
+
+
+def dispatch(outer, item):
+    """
+        Runs one sub-request through its view.
+
+        Returns:
+            dict: ``id``, ``status``, ``headers`` and ``body`` of the sub-response.
+    """
+    result = {'id': item.get('id')}
+    path = item['path'].partition('?')[0]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        match = None
+    # Viewsets expose their class as ``cls``, other API views as ``view_class``.
+    view_class = (getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)) if match else None
+    if view_class is BatchView:
+        return {**result, 'status': 400, 'headers': {}, 'body': {'detail': 'Batches cannot be nested.'}}
+    if not (isinstance(view_class, type) and issubclass(view_class, APIView)):
+        # Plain Django views (the admin, ...) rely on the session, CSRF and middleware the batch skips.
+        return {**result, 'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+
+    request = build_request(outer, item)
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    except Exception:
+        logger.exception('Batch sub-request %s %s failed', item['method'], item['path'])
+        return {**result, 'status': 500, 'headers': {}, 'body': {'detail': 'Internal server error.'}}
+    if response.streaming:
+        return {**result, 'status': 400, 'headers': {}, 'body': {'detail': 'Streaming responses cannot be batched.'}}
+    headers = {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)}
+    return {**result, 'status': response.status_code, 'headers': headers, 'body': _response_body(response)}
+
+
+def _dispatch_in_thread(outer, item):
+    try:
+        return dispatch(outer, item)
+    finally:
+        connections.close_all()
+
+
+def _groups(items, parallel):
+    """
+        Splits the items into runs that may execute concurrently.
+    """
+    group = []
+    for item in items:
+        if parallel and item['method'] in PARALLEL_METHODS:
+            group.append(item)
+            continue
+        if group:
+            yield group
+            group = []
+        yield [item]
+    if group:
+        yield group
+
+
+class BatchView(APIView):
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+
+        responses = []
+        for group in _groups(items, serializer.validated_data['parallel']):
+            if len(group) == 1:
+                responses.append(dispatch(request, group[0]))
+                continue
+            workers = min(len(group), getattr(settings, 'BATCH_MAX_WORKERS', 4))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Each thread runs in a copy of this request's context (routing state, history batch).
+                futures = [
+                    pool.submit(contextvars.copy_context().run, _dispatch_in_thread, request, item) for item in group
+                ]
+                responses.extend(future.result() for future in futures)
+        return Response({'responses': responses})
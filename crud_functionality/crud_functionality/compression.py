@@ -0,0 +1,209 @@
+"""
+Response compression: gzip, plus brotli and zstd when their packages are installed.
+
+``CompressionMiddleware`` picks the best encoding the client accepts (in
+``COMPRESSION_ENCODINGS`` order) and compresses text-like responses of at
+least ``COMPRESSION_MIN_SIZE`` bytes. Streaming responses (CSV exports) are
+compressed chunk by chunk and flushed every ``COMPRESSION_STREAM_FLUSH_SIZE``
+bytes of input, so the client keeps receiving data as rows are produced.
+
+Responses that already carry a ``Content-Encoding`` are passed through; that is
+how cached responses stored with ``precompress()`` bodies skip the work. Byte
+range responses are passed through too, their ranges count unencoded bytes.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'application/x-ndjson',
+    'image/svg+xml',
+)
+
+
+def _gzip_compressor():
+    compressor = zlib.compressobj(getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _brotli_compressor():
+    compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd_compressor():
+    compressor = zstandard.ZstdCompressor(level=getattr(settings, 'COMPRESSION_ZSTD_LEVEL', 3)).compressobj()
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH),
+    )
+
+
+# Encoding -> factory of (compress, flush, finish) callables.
+COMPRESSORS = {'gzip': _gzip_compressor}
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli_compressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd_compressor
+
+
+def available_encodings():
+    """
+        Returns the configured encodings that can be produced here, best first.
+    """
+    preferred = getattr(settings, 'COMPRESSION_ENCODINGS', ('zstd', 'br', 'gzip'))
+    return [encoding for encoding in preferred if encoding in COMPRESSORS]
+
+
+def negotiate(accept_encoding, encodings=None):
+    """
+        Picks the encoding for a request's ``Accept-Encoding`` header.
+
+        Args:
+            accept_encoding (str): The header value.
+            encodings (iterable): Candidates, best first; defaults to ``available_encodings()``.
+
+        Returns:
+            str: The chosen encoding, or ``None`` to send the body as is.
+    """
+    weights = {}
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        name, _, value = params.partition('=')
+        try:
+            weights[coding.strip()] = float(value) if name.strip() == 'q' else 1.0
+        except ValueError:
+            continue
+    candidates = [
+        encoding for encoding in (available_encodings() if encodings is None else encodings)
+        if weights.get(encoding, weights.get('*', 0)) > 0
+    ]
+    if not candidates:
+        return None
+    # Highest q-value wins; ties go to the server's preference order.
+    return max(candidates, key=lambda encoding: weights.get(encoding, weights.get('*', 0)))
+
+
+def compress(data, encoding):
+    compress_chunk, _, finish = COMPRESSORS[encoding]()
+    return compress_chunk(data) + finish()
+
+
+def is_compressible(content_type, size=None):
+    content_type = (content_type or '').lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return False
+    return size is None or size >= getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+def precompress(content, content_type):
+    """
+        Compresses a body with every available encoding, for storing next to it.
+
+        Returns:
+            dict: Encoding to compressed body, only for encodings that made it smaller.
+    """
+    if not is_compressible(content_type, len(content)):
+        return {}
+    variants = {}
+    for encoding in available_encodings():
+        compressed = compress(content, encoding)
+        if len(compressed) < len(content):
+            variants[encoding] = compressed
+    return variants
+
+
+def compress_stream(chunks, encoding):
+    compress_chunk, flush, finish = COMPRESSORS[encoding]()
+    flush_size = getattr(settings, 'COMPRESSION_STREAM_FLUSH_SIZE', 64 * 1024)
+    pending = 0
+    for chunk in chunks:
+        data = compress_chunk(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+async def compress_async_stream(chunks, encoding):
+    compress_chunk, flush, finish = COMPRESSORS[encoding]()
+    flush_size = getattr(settings, 'COMPRESSION_STREAM_FLUSH_SIZE', 64 * 1024)
+    pending = 0
+    async for chunk in chunks:
+        data = compress_chunk(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+def mark_encoded(response, encoding):
+    """
+        Sets the headers of a response whose body is encoded with ``encoding``.
+    """
+    response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # As GZipMiddleware does: the encoded body is not byte-identical any more.
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware:
+    """
+        Compresses responses with the best encoding the client accepts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if (
+            response.has_header('Content-Encoding')
+            or response.has_header('Content-Range')
+            or not is_compressible(response.get('Content-Type'))
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+                return response
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        mark_encoded(response, encoding)
+        return response
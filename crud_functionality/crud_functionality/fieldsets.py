@@ -0,0 +1,92 @@
+"""
+Sparse fieldsets: ``?fields=id,hospital_name`` / ``?exclude=address``.
+
+The serializer mixin trims the output fields of the top-level serializer, and
+the view mixin narrows the SQL to the matching columns with ``only()`` and only
+prefetches relations that are still part of the response. Both apply to safe
+methods only; writes always see the full serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fieldset(request):
+    """
+        Reads the sparse fieldset parameters of a request.
+
+        Returns:
+            tuple: ``(fields, exclude)``; ``fields`` is ``None`` when not given.
+    """
+    params = getattr(request, 'query_params', request.GET)
+    fields = parse_field_list(params.get('fields')) if 'fields' in params else None
+    return fields, parse_field_list(params.get('exclude'))
+
+
+def is_response_root(serializer):
+    """
+        Tells whether ``serializer`` renders the response itself (or its items),
+        as opposed to being nested inside another serializer.
+    """
+    parent = serializer.parent
+    return parent is None or (isinstance(parent, ListSerializer) and parent.parent is None)
+
+
+class SparseFieldsetsMixin:
+    """
+        Serializer mixin dropping fields not selected by ``?fields=``/``?exclude=``.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not is_response_root(self):
+            return fields
+        only, exclude = requested_fieldset(request)
+        return {
+            name: field for name, field in fields.items()
+            if (only is None or name in only) and name not in exclude
+        }
+
+
+class SparseFieldsetsViewMixin:
+    """
+        View mixin loading only the columns the trimmed serializer reads.
+
+        Attributes:
+            prefetch_fields (tuple): Relations prefetched when they are in the response.
+    """
+    prefetch_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+
+        fields = self.get_serializer().fields
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        prefetch = []
+        deferrable = True
+        for name, field in fields.items():
+            source = field.source.split('.')[0]
+            if name in self.prefetch_fields:
+                prefetch.append(source)
+                continue
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                # Method fields and properties ('*' sources included) may read
+                # any attribute, so the row has to be loaded in full.
+                deferrable = False
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(*columns) if deferrable else queryset
@@ -0,0 +1,46 @@
+"""
+Query parameter filtering shared by list and export endpoints.
+
+Views declare ``filter_fields`` as a mapping of model field to allowed lookups,
+e.g. ``{'status': ['exact'], 'datetime': ['gte', 'lte']}``; a plain list means
+exact matches only. ``?status=ACTIVE&datetime__gte=2024-01-01`` then becomes a
+single ``filter()`` call. Values are parsed with the model field so bad input
+is a 400 rather than a database error.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class FieldFilterBackend(BaseFilterBackend):
+
+    def get_allowed_lookups(self, view):
+        filter_fields = getattr(view, 'filter_fields', {})
+        if not isinstance(filter_fields, dict):
+            filter_fields = {name: ['exact'] for name in filter_fields}
+        return filter_fields
+
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        errors = {}
+        for name, lookups in self.get_allowed_lookups(view).items():
+            model_field = queryset.model._meta.get_field(name)
+            for lookup in lookups:
+                param = name if lookup == 'exact' else f'{name}__{lookup}'
+                if param not in request.query_params:
+                    continue
+                raw = request.query_params[param]
+                try:
+                    if lookup == 'in':
+                        value = [model_field.to_python(item) for item in raw.split(',') if item]
+                    elif lookup == 'isnull':
+                        value = raw.lower() in ('1', 'true', 'yes')
+                    else:
+                        value = model_field.to_python(raw)
+                except DjangoValidationError as error:
+                    errors[param] = error.messages
+                    continue
+                filters[f'{model_field.attname if model_field.is_relation else name}__{lookup}'] = value
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**filters)
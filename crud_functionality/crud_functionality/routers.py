@@ -0,0 +1,174 @@
+"""
+Database routing between the primary and read replicas.
+
+Every query goes to ``default`` unless the code path explicitly opted into
+replica reads, e.g. list/retrieve endpoints through :class:`ReplicaReadMixin`.
+Replicas are picked round-robin among the ones passing a periodic health
+check. Once a request writes, the rest of it reads from the primary, and
+:class:`PrimaryPinningMiddleware` keeps that client on the primary for a few
+seconds so it reads its own writes while the replicas catch up.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'db_primary_pin'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_request_state = ContextVar('routing_state', default=None)
+
+
+class RoutingState:
+    """
+        Per-request routing flags shared between the router and the middleware.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class ReplicaPool:
+    """
+        Round-robin over the configured replica aliases, skipping unhealthy ones.
+
+        Health is checked lazily with ``SELECT 1`` and remembered for
+        ``REPLICA_HEALTH_CHECK_INTERVAL`` seconds per alias.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aliases = None
+        self._cycle = None
+        self._health = {}
+
+    def aliases(self):
+        replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+        with self._lock:
+            if replicas != self._aliases:
+                self._aliases = replicas
+                self._cycle = itertools.cycle(replicas)
+                self._health = {}
+        return replicas
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 30)
+        now = time.monotonic()
+        healthy, checked_at = self._health.get(alias, (None, 0))
+        if healthy is not None and now - checked_at < interval:
+            return healthy
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except Exception:
+            healthy = False
+        self._health[alias] = (healthy, now)
+        return healthy
+
+    def next(self):
+        replicas = self.aliases()
+        for _ in range(len(replicas)):
+            with self._lock:
+                alias = next(self._cycle)
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+
+replica_pool = ReplicaPool()
+
+
+@contextmanager
+def replica_reads():
+    """
+        Routes reads issued inside the block to a replica, when one is configured.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+        Sends opted-in reads to a healthy replica and everything else to ``default``.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if not _replica_reads.get() or (state is not None and (state.pinned or state.wrote)):
+            return 'default'
+        return replica_pool.next() or 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class PrimaryPinningMiddleware:
+    """
+        Keeps a client on the primary for ``REPLICA_PIN_SECONDS`` after it wrote.
+
+        The marker is a short-lived cookie, so it works across worker processes
+        without shared state.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """
+        View mixin running the ``replica_actions`` of a view against a replica.
+
+        Works with viewsets (uses the routed action) and plain generic views
+        (a GET with a lookup kwarg is ``retrieve``, otherwise ``list``).
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def get_read_action(self, request, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        action_map = getattr(self, 'action_map', None)
+        if action_map is not None:
+            return action_map.get(request.method.lower())
+        lookup = getattr(self, 'lookup_url_kwarg', None) or getattr(self, 'lookup_field', 'pk')
+        return 'retrieve' if lookup in kwargs else 'list'
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.get_read_action(request, **kwargs) in self.replica_actions:
+            with replica_reads():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
@@ -13,6 +13,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from crud_functionality.database import sqlite_database, SQLITE_REPLICA_PRAGMAS
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,10 +48,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'crud_functionality.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crud_functionality.routers.PrimaryPinningMiddleware',
+    'referral_system_database.history.ChangeHistoryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,11 +84,113 @@ WSGI_APPLICATION = 'crud_functionality.wsgi.application'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 DATABASES = {
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3'),
+}
+
+# Read replicas, as a list of SQLite paths separated by os.pathsep.
+# e.g. DATABASE_REPLICA_PATHS=/srv/replica1.sqlite3:/srv/replica2.sqlite3
+DATABASE_REPLICAS = []
+for index, replica_path in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_PATHS', '').split(os.pathsep))):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = sqlite_database(replica_path, pragmas=SQLITE_REPLICA_PRAGMAS, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['crud_functionality.routers.ReadReplicaRouter']
+REPLICA_HEALTH_CHECK_INTERVAL = 30  # seconds an alias' health check result is reused
+REPLICA_PIN_SECONDS = 5  # how long a client reads from the primary after writing
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Local-memory caches are per process and evict least recently used entries
+# past MAX_ENTRIES. Point 'responses' at memcached/redis when running several
+# workers so invalidation reaches all of them.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
 }
+RESPONSE_CACHE_ALIAS = 'responses'
+
+# Response compression (brotli and zstd need the brotli / zstandard packages)
+COMPRESSION_ENCODINGS = ('zstd', 'br', 'gzip')  # server preference when the client accepts several
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent as they are
+COMPRESSION_STREAM_FLUSH_SIZE = 64 * 1024  # streamed bodies are flushed to the client after this much input
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_ZSTD_LEVEL = 3
+
+# Batch endpoint
+BATCH_MAX_REQUESTS = 20  # sub-requests accepted per batch
+BATCH_MAX_WORKERS = 4  # threads running consecutive GET sub-requests in parallel
+
+# Idempotency keys
+IDEMPOTENCY_TTL_HOURS = 24  # a key's stored response is replayed for this long
+IDEMPOTENCY_LOCK_SECONDS = 60  # a claim left by a crashed request is taken over after this long
+IDEMPOTENCY_WAIT_SECONDS = 10  # a concurrent duplicate waits this long for the first request, then gets a 409
+
+# Chunked uploads
+UPLOAD_MAX_SIZE = 512 * 1024 * 1024  # bytes per file
+UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 * 1024  # bytes per PUT
+UPLOAD_BUFFER_SIZE = 64 * 1024  # chunks are streamed to disk and the hash in pieces of this size
+UPLOAD_EXPIRY_HOURS = 48  # unfinished uploads are discarded after this long
+UPLOAD_PARTIAL_DIR = None  # where chunks are assembled; defaults to MEDIA_ROOT/partial
+UPLOAD_SENDFILE_HEADER = None  # e.g. 'X-Accel-Redirect' (nginx) or 'X-Sendfile' to let the web server send files
+UPLOAD_SENDFILE_PREFIX = '/protected/'  # internal location the web server maps to MEDIA_ROOT
+
+# Offline registry bundles
+REGISTRY_SNAPSHOT_INTERVAL = 300  # seconds between the scheduled checks of the tables for a new version
+REGISTRY_KEEP_VERSIONS = 30  # older versions are deleted; their clients download a full snapshot
+REGISTRY_GZIP_LEVEL = 9
+
+# Offline sync
+SYNC_MAX_ITEMS = 500  # writes accepted per sync request
+SYNC_BULK_BATCH_SIZE = 500  # rows per bulk INSERT / UPDATE statement
+
+# Role-based access scopes
+ACCESS_SCOPE_CACHE_ALIAS = 'default'
+ACCESS_SCOPE_CACHE_SECONDS = 900  # a resolved scope is reused per access token for this long
+
+# Bed occupancy
+BED_HOLD_MINUTES = 30  # lifetime of an unconfirmed bed reservation
+BED_SNAPSHOT_MAX_AGE = 60  # seconds before the availability snapshot is rebuilt
+
+# Background jobs
+JOB_LEASE_SECONDS = 300  # a running job is handed to another worker after this long
+JOB_RETRY_BASE_SECONDS = 10  # first retry delay, doubled on every further attempt
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_SCHEDULE = {  # recurring tasks queued by run_workers: task name -> seconds between runs
+    'occupancy.expire_reservations': 60,
+    'idempotency.purge_expired': 3600,
+    'uploads.purge_expired': 3600,
+    'registry.snapshot': REGISTRY_SNAPSHOT_INTERVAL,
+}
+
+# Primary keys of DefaultModel subclasses: time-ordered UUIDv7 instead of random UUIDv4.
+# Existing rows can be re-keyed with `manage.py rekey_time_ordered_ids`.
+TIME_ORDERED_IDS = False
+
+# Follow-up calls
+FOLLOW_UP_FIRST_CALL_HOURS = 24  # first call after the referral
+FOLLOW_UP_REPEAT_DAYS = 3  # next call after an answered one, unless the patient is healthy/deceased/declined
+FOLLOW_UP_RETRY_HOURS = 4  # retry after an unanswered call
+FOLLOW_UP_MAX_UNANSWERED = 5  # stop calling after this many unanswered calls in a row
+FOLLOW_UP_LEASE_MINUTES = 15  # how long a caller holds a claimed referral
+
+# Referral routing recommendations
+ROUTING_REBUILD_SECONDS = 3600  # full rebuild of the referral flow matrices
+ROUTING_DISTANCE_SCALE_KM = 50  # proximity score halves roughly every 35 km
+ROUTING_WEIGHTS = {}  # overrides for referral_system_database.routing.DEFAULT_WEIGHTS
+
+# Archival
+ARCHIVE_HORIZON_DAYS = 180  # closed cases' history older than this moves to the archive tables
 
 
 # Password validation
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from crud_functionality.database import SQLITE_REPLICA_PRAGMAS, sqlite_database, sync_sqlite_replicas
+from crud_functionality.routers import ReplicaPool, replica_reads
+from referral_system_database.models import State
+
+REPLICAS = ['replica_1', 'replica_2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_HEALTH_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+        Reads opted into replicas, against two SQLite replica files seeded from the primary.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = {alias: os.path.join(directory.name, f'{alias}.sqlite3') for alias in REPLICAS}
+        for alias, path in self.paths.items():
+            self.add_replica(alias, path)
+        State.objects.create(state_name='primary', num_code='1')
+        sync_sqlite_replicas()
+        # Tell the copies apart: each replica names the state after itself.
+        for alias, path in self.paths.items():
+            with sqlite3.connect(path) as replica:
+                replica.execute(f'UPDATE {State._meta.db_table} SET state_name = ?', [alias])
+            replica.close()
+        # A fresh pool, so the round robin starts at the first replica.
+        patcher = mock.patch('crud_functionality.routers.replica_pool', ReplicaPool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_replica(self, alias, path):
+        entry = sqlite_database(path, pragmas=SQLITE_REPLICA_PRAGMAS, conn_max_age=0)
+        connections.settings[alias] = connections.configure_settings({**connections.settings, alias: entry})[alias]
+        self.addCleanup(self.remove_replica, alias)
+
+    def remove_replica(self, alias):
+        try:
+            connections[alias].close()
+            del connections[alias]
+        except AttributeError:
+            pass
+        connections.settings.pop(alias, None)
+
+    def break_replica(self, alias):
+        connections[alias].close()
+        connections[alias].settings_dict['NAME'] = os.path.join(self.paths[alias], 'missing', 'db.sqlite3')
+
+    def read_states(self, count):
+        with replica_reads():
+            return [State.objects.get().state_name for _ in range(count)]
+
+    def test_reads_without_opt_in_use_the_primary(self):
+        self.assertEqual(State.objects.get().state_name, 'primary')
+
+    def test_reads_round_robin_across_replicas(self):
+        self.assertEqual(self.read_states(4), ['replica_1', 'replica_2', 'replica_1', 'replica_2'])
+
+    def test_unhealthy_replica_is_skipped(self):
+        self.break_replica('replica_1')
+        self.assertEqual(self.read_states(3), ['replica_2'] * 3)
+
+    def test_reads_fall_back_to_the_primary(self):
+        for alias in REPLICAS:
+            self.break_replica(alias)
+        self.assertEqual(self.read_states(2), ['primary'] * 2)
@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from crud_functionality.batch import BatchView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('api/', include('app.urls')),
     path('referral_system_database/', include('referral_system_database.urls'))
 ]
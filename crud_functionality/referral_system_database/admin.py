@@ -1,3 +1,186 @@
+"""
+Admin for the referral system.
+
+Changelists of the large tables are tuned to a fixed number of queries per
+page: related objects shown in ``list_display`` (and the ones their
+``__str__`` walks into) come from ``list_select_related``, every foreign key
+to a master or location table is an autocomplete widget instead of a full
+``<select>``, list filters only use indexed columns, and the paginator reads
+an estimated row count for unfiltered lists instead of a ``COUNT(*)``.
+"""
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from referral_system_database.models import (
+    StaffUser, Hospital, MedicalServiceUnit, HospitalMedicalServiceUnit, HospitalIncharge, Referral, File,
+)
+from referral_system_database.creation_models.location_models import State, District, Block
+from referral_system_database.creation_models.master_models import (
+    HospitalType, WorkRole, Employer, ServiceCadre, Speciality, Position, Incharges, Empanelments,
+)
+from referral_system_database.creation_models.medical_models import Expert
+
+# Unfiltered changelists of tables estimated above this size show the estimate.
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(model, using):
+    """
+        Returns the planner's row count estimate for ``model``'s table, or ``None``.
+
+        PostgreSQL and MySQL keep one in their catalogs; on SQLite the largest
+        rowid is used, which matches the count until rows get deleted.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+        Paginator using ``estimated_count()`` for unfiltered querysets of large tables.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+        Base admin for tables too large to count or list without care.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class NameSearchAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+for model in (HospitalType, WorkRole, Employer, ServiceCadre, Speciality, Position, Incharges, Empanelments):
+    admin.site.register(model, NameSearchAdmin)
+
+
+@admin.register(State)
+class StateAdmin(admin.ModelAdmin):
+    search_fields = ('state_name',)
+    ordering = ('state_name',)
+
+
+@admin.register(District)
+class DistrictAdmin(admin.ModelAdmin):
+    list_display = ('district_name', 'state')
+    list_select_related = ('state',)
+    search_fields = ('district_name',)
+    autocomplete_fields = ('state',)
+    ordering = ('district_name',)
+
+    def get_queryset(self, request):
+        # __str__ includes the state; autocomplete results go through here too.
+        return super().get_queryset(request).select_related('state')
+
+
+@admin.register(Block)
+class BlockAdmin(admin.ModelAdmin):
+    list_display = ('block_name', 'district')
+    list_select_related = ('district',)
+    search_fields = ('block_name',)
+    autocomplete_fields = ('district',)
+    ordering = ('block_name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('district')
+
+
+@admin.register(MedicalServiceUnit)
+class MedicalServiceUnitAdmin(admin.ModelAdmin):
+    list_display = ('msu_name', 'status')
+    list_filter = ('status',)
+    search_fields = ('msu_name',)
+    ordering = ('msu_name',)
+
+
+@admin.register(Expert)
+class ExpertAdmin(admin.ModelAdmin):
+    search_fields = ('expert_name',)
+    ordering = ('expert_name',)
+
+
+class HospitalMedicalServiceUnitInline(admin.TabularInline):
+    model = HospitalMedicalServiceUnit
+    autocomplete_fields = ('msu',)
+    fields = ('msu', 'bed_count', 'occupied_beds', 'reserved_beds', 'contact_number')
+    readonly_fields = ('occupied_beds', 'reserved_beds')
+    extra = 0
+
+
+class HospitalInchargeInline(admin.TabularInline):
+    model = HospitalIncharge
+    autocomplete_fields = ('staff_user', 'incharge_role')
+    extra = 0
+
+
+@admin.register(Hospital)
+class HospitalAdmin(LargeTableAdmin):
+    list_display = ('hospital_name', 'hospital_id', 'hospital_type', 'district', 'block', 'setting', 'ownership', 'status')
+    list_select_related = ('hospital_type', 'district__state', 'block__district')
+    list_filter = ('status', 'setting', 'ownership')
+    search_fields = ('^hospital_name', '=hospital_id', '=org_facility_id')
+    autocomplete_fields = ('hospital_type', 'empanelments', 'state', 'district', 'block')
+    exclude = ('medical_service_unit',)
+    inlines = (HospitalMedicalServiceUnitInline, HospitalInchargeInline)
+    ordering = ('hospital_name',)
+
+
+@admin.register(StaffUser)
+class StaffUserAdmin(LargeTableAdmin):
+    list_display = ('email', 'full_name', 'role', 'place_of_posting', 'work_role', 'status', 'is_active')
+    list_select_related = ('place_of_posting', 'work_role')
+    list_filter = ('role',)
+    search_fields = ('=email', '^full_name', '=staff_user_id', '=mobile_number')
+    autocomplete_fields = (
+        'medical_service_unit', 'work_role', 'employer', 'service_cadre', 'speciality', 'place_of_posting',
+        'position', 'expert', 'incharge_roles', 'saved_hospitals', 'saved_experts',
+    )
+    exclude = ('password', 'groups', 'user_permissions')
+    readonly_fields = ('staff_user_id', 'last_login')
+    ordering = ('email',)
+
+
+@admin.register(Referral)
+class ReferralAdmin(LargeTableAdmin):
+    list_display = (
+        'datetime', 'source_hospital', 'referred_hospital', 'medical_Service_Unit', 'referred_by', 'transport_mode',
+    )
+    list_select_related = ('source_hospital', 'referred_hospital', 'medical_Service_Unit', 'referred_by')
+    list_filter = ('transport_mode',)
+    date_hierarchy = 'datetime'
+    autocomplete_fields = ('source_hospital', 'referred_hospital', 'medical_Service_Unit', 'referred_by')
+    raw_id_fields = ('attachments_referral_form', 'attachments_investigation_reports')
+    ordering = ('-datetime',)
+
 
-# Register your models here.
+admin.site.register(File)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ReferralSystemDatabaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'referral_system_database'
+
+    def ready(self):
+        from crud_functionality.database import connect_signals
+        connect_signals()
+
+        from referral_system_database import signals  # noqa: F401
@@ -0,0 +1,178 @@
+"""
+Hot/cold split for case history and logs.
+
+Rows of ``CaseStatus``, ``CaseFollowUp`` and ``Logging`` that are older than the
+retention horizon and belong to a closed case are moved into ``*_archive``
+tables in batches, one transaction per batch, so the hot tables only hold
+recent and open work. A case is closed once it has reached a terminal status
+(discharged, LAMA, demise, ...), whether that status row is still hot or
+already archived.
+
+Reads do not see archived rows unless asked to: list endpoints using
+:class:`ArchiveReadMixin` union them in for ``?include_archived=true``.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from referral_system_database.models import (
+    CaseStatus, CaseFollowUp, Logging, IntermediatesStatusClass,
+    ArchivedCaseStatus, ArchivedCaseFollowUp, ArchivedLogging,
+)
+
+TERMINAL_CASE_STATUSES = ('DISCHARGED', 'RETURN-DISCHARGE', 'LAMA', 'DEMISE', 'DID-NOT-ARRIVE')
+
+
+def _closed(lookup, column):
+    # Terminal statuses may themselves have been archived already.
+    condition = {'status__in': TERMINAL_CASE_STATUSES, f'{column}__isnull': False}
+    return (
+        Q(**{f'{lookup}__in': CaseStatus.objects.filter(**condition).values(column)})
+        | Q(**{f'{lookup}__in': ArchivedCaseStatus.objects.filter(**condition).values(column)})
+    )
+
+
+@dataclass
+class ArchivePolicy:
+    """
+        Which rows of a hot model may move to its archive table.
+
+        Attributes:
+            model (Model): Hot model.
+            archive (Model): Its archive twin.
+            date_field (str): Field compared with the retention horizon.
+            eligible (callable): Returns a ``Q`` restricting rows to closed cases.
+    """
+    model: type
+    archive: type
+    date_field: str
+    eligible: object = None
+
+    def candidates(self, cutoff):
+        queryset = self.model.objects.filter(**{f'{self.date_field}__lt': cutoff})
+        if self.eligible is not None:
+            queryset = queryset.filter(self.eligible())
+        return queryset
+
+
+ARCHIVE_POLICIES = {
+    'case_status': ArchivePolicy(
+        CaseStatus, ArchivedCaseStatus, 'datetime',
+        # Rows linked to case files through IntermediatesStatusClass stay hot:
+        # deleting them would cascade to the link.
+        lambda: _closed('case_file', 'case_file') & ~Q(pk__in=IntermediatesStatusClass.objects.values('case_status')),
+    ),
+    'case_follow_up': ArchivePolicy(
+        CaseFollowUp, ArchivedCaseFollowUp, 'call_date', lambda: _closed('case_status', 'referral'),
+    ),
+    'logging': ArchivePolicy(Logging, ArchivedLogging, 'logged_at'),
+}
+
+
+@dataclass
+class ArchiveReport:
+    moved: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def archive_history(kind, horizon_days=None, batch_size=1000, dry_run=False):
+    """
+        Moves eligible rows older than the horizon into the archive table.
+
+        Args:
+            kind (str): One of ``ARCHIVE_POLICIES``.
+            horizon_days (int): Age in days after which rows move; defaults to
+                ``ARCHIVE_HORIZON_DAYS``.
+            batch_size (int): Rows moved per transaction.
+            dry_run (bool): Only count the eligible rows.
+
+        Returns:
+            ArchiveReport: Rows moved, batches and timing.
+    """
+    policy = ARCHIVE_POLICIES[kind]
+    horizon_days = horizon_days if horizon_days is not None else getattr(settings, 'ARCHIVE_HORIZON_DAYS', 180)
+    cutoff = timezone.now() - timedelta(days=horizon_days)
+    report = ArchiveReport()
+    started = time.perf_counter()
+    if dry_run:
+        report.moved = policy.candidates(cutoff).count()
+        report.seconds = time.perf_counter() - started
+        return report
+
+    columns = [field.attname for field in policy.model._meta.concrete_fields]
+    while True:
+        with transaction.atomic():
+            ids = list(policy.candidates(cutoff).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            rows = policy.model.objects.filter(pk__in=ids).values(*columns)
+            policy.archive.objects.bulk_create([policy.archive(**row) for row in rows])
+            policy.model.objects.filter(pk__in=ids).delete()
+        report.moved += len(ids)
+        report.batches += 1
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+class ArchiveUnion:
+    """
+        Hot and archived rows as one countable, sliceable sequence.
+
+        Backed by a single ``UNION ALL`` query ordered like the hot queryset;
+        rows come back as unsaved instances of the hot model so serializers
+        treat both alike.
+    """
+
+    def __init__(self, hot, archived):
+        self.model = hot.model
+        columns = [field.attname for field in self.model._meta.concrete_fields]
+        ordering = hot.query.order_by or self.model._meta.ordering
+        self.queryset = (
+            hot.order_by().values(*columns)
+            .union(archived.order_by().values(*columns), all=True)
+            .order_by(*ordering)
+        )
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.model(**row) for row in self.queryset[index]]
+        return self.model(**self.queryset[index])
+
+    def __iter__(self):
+        for row in self.queryset.iterator():
+            yield self.model(**row)
+
+
+class ArchiveReadMixin:
+    """
+        Viewset mixin adding archived rows to list responses on ``?include_archived=true``.
+
+        Attributes:
+            archive_model (Model): Archive twin of the viewset's model.
+    """
+    archive_model = None
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_archive_queryset(self, using):
+        return self.archive_model.objects.using(using)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.include_archived():
+            archived = super().filter_queryset(self.get_archive_queryset(queryset.db))
+            return ArchiveUnion(queryset, archived)
+        return queryset
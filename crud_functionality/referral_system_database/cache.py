@@ -0,0 +1,245 @@
+"""
+Response caching for read-heavy endpoints.
+
+Rendered list/retrieve responses are stored in the ``RESPONSE_CACHE_ALIAS``
+cache (a local-memory LRU by default). Keys include the caller's scope, the
+query string and a generation counter per model the view depends on; writes to
+those models bump the counter (see ``signals.py``), so stale entries are never
+read again and simply age out of the LRU.
+
+Entries also hold the body compressed with every available encoding (see
+``crud_functionality/compression.py``), so hits are served without compressing.
+
+Concurrent misses on the same key are collapsed: one request recomputes while
+the others wait for its result instead of all hitting the database.
+
+Note that with the local-memory backend both the entries and the generation
+counters live per process; deployments with several workers should point the
+alias at a shared backend (memcached, redis) for cross-worker invalidation.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from crud_functionality import compression
+
+LOCK_TIMEOUT = 30  # seconds before an abandoned recompute lock expires
+LOCK_POLL_INTERVAL = 0.05
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _record(metric):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+def response_cache_metrics():
+    """
+        Returns a snapshot of the process' cache counters.
+
+        Returns:
+            dict: ``hits``, ``misses``, ``coalesced`` (waited for another
+            request's recompute) and ``bypassed`` counts.
+    """
+    with _metrics_lock:
+        return {key: _metrics[key] for key in ('hits', 'misses', 'coalesced', 'bypassed')}
+
+
+def _generation_key(model):
+    return f'response-generation:{model._meta.label_lower}'
+
+
+def bump_generation(model):
+    """
+        Invalidates every cached response depending on ``model``.
+    """
+    cache = response_cache()
+    key = _generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Seeded with the clock so a counter lost to eviction never reuses
+        # a generation number an old entry was stored under.
+        if not cache.add(key, time.time_ns(), None):
+            cache.incr(key)
+
+
+def generations(models):
+    cache = response_cache()
+    keys = [_generation_key(model) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+@contextmanager
+def _single_flight(key):
+    with _flights_lock:
+        lock, waiters = _flights.get(key, (threading.Lock(), 0))
+        _flights[key] = (lock, waiters + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _flights_lock:
+            lock, waiters = _flights[key]
+            if waiters == 1:
+                del _flights[key]
+            else:
+                _flights[key] = (lock, waiters - 1)
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+        Returns the cached value for ``key``, computing it at most once at a time.
+
+        Threads of this process queue on a local lock; other processes are held
+        off by an ``add()``-based lock in the cache itself and poll for the
+        result until it shows up or the lock expires.
+
+        Args:
+            key (str): Cache key.
+            compute (callable): Builds the value on a miss.
+            timeout (int): Entry lifetime, defaults to the alias' ``TIMEOUT``.
+
+        Returns:
+            tuple: ``(value, hit)`` where ``hit`` tells whether it came from the cache.
+    """
+    cache = response_cache()
+    value = cache.get(key)
+    if value is not None:
+        _record('hits')
+        return value, True
+
+    with _single_flight(key):
+        value = cache.get(key)
+        if value is not None:
+            _record('coalesced')
+            return value, True
+
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                _record('coalesced')
+                return value, True
+            if time.monotonic() > deadline:
+                break
+        try:
+            _record('misses')
+            value = compute()
+            if value is not None:
+                cache.set(key, value, **({} if timeout is None else {'timeout': timeout}))
+            return value, False
+        finally:
+            cache.delete(lock_key)
+
+
+class CachedResponseMixin:
+    """
+        Viewset mixin caching rendered JSON responses of ``cached_actions``.
+
+        Attributes:
+            cache_dependencies (tuple): Models whose writes invalidate the responses.
+            cached_actions (tuple): Viewset actions served from the cache.
+            cache_timeout (int): Entry lifetime, ``None`` for the alias default.
+    """
+    cache_dependencies = ()
+    cached_actions = ('list', 'retrieve')
+    cache_timeout = None
+
+    def get_cache_scope(self, request):
+        user = request.user
+        return f'user:{user.pk}' if user and user.is_authenticated else 'anonymous'
+
+    def get_response_cache_key(self, request, **kwargs):
+        query = '&'.join(sorted(f'{key}={value}' for key, values in request.query_params.lists() for value in values))
+        parts = [
+            getattr(self, 'basename', None) or type(self).__name__,
+            self.action,
+            self.get_cache_scope(request),
+            request.get_host(),
+            request.accepted_media_type,
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''),
+            query,
+            *map(str, generations(self.cache_dependencies)),
+        ]
+        return 'response:' + hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def is_cacheable(self, request):
+        return (
+            request.method == 'GET'
+            and self.action in self.cached_actions
+            and getattr(request.accepted_renderer, 'format', None) == 'json'
+        )
+
+    def render_for_cache(self, request, response):
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        if response.status_code != 200:
+            return None
+        return {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            # Compressed once here rather than by the middleware on every hit.
+            'encodings': compression.precompress(response.content, response['Content-Type']),
+        }
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            _record('bypassed')
+            return handler(request, *args, **kwargs)
+
+        uncached = []
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            uncached.append(response)
+            return self.render_for_cache(request, response)
+
+        key = self.get_response_cache_key(request, **kwargs)
+        entry, hit = get_or_compute(key, compute, self.cache_timeout)
+        if entry is None:
+            # Not cacheable (e.g. 404); hand back what the view produced.
+            return uncached[0]
+        encodings = entry.get('encodings', {})
+        encoding = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING'),
+            [encoding for encoding in compression.available_encodings() if encoding in encodings],
+        )
+        if encoding is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            patch_vary_headers(response, ('Accept-Encoding',))
+        else:
+            response = HttpResponse(encodings[encoding], content_type=entry['content_type'])
+            compression.mark_encoded(response, encoding)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -4,7 +4,7 @@ from referral_system_database.creation_models.master_models import ClinicalPrivi
 
 
 class MedicalCondition(DefaultModel):
-    icd = models.CharField(max_length=100)
+    icd = models.CharField(max_length=100, unique=True)
     name = models.CharField(max_length=100)
     status = models.BooleanField(default=False)
     head_name = models.CharField(max_length=100)
@@ -1,8 +1,155 @@
+import os
+import threading
+import time
 import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+_uuid7_lock = threading.Lock()
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+
+def uuid7(timestamp_ms=None):
+    """
+        Returns a time-ordered UUID (RFC 9562 version 7).
+
+        The first 48 bits are the Unix time in milliseconds, so ids sort in
+        creation order and new rows land at the right edge of the primary key
+        index instead of at random pages. The 12 bits after the version hold a
+        counter (random start) making ids from one process strictly increasing
+        within a millisecond; the remaining 62 bits are random.
+
+        Args:
+            timestamp_ms (int): Time to encode instead of now, e.g. a row's
+                creation time when back-filling ids.
+    """
+    global _uuid7_last_ms, _uuid7_counter
+    with _uuid7_lock:
+        ms = time.time_ns() // 1_000_000 if timestamp_ms is None else timestamp_ms
+        if ms == _uuid7_last_ms or (timestamp_ms is None and ms < _uuid7_last_ms):
+            # Same millisecond, or the clock stepped back: keep counting up.
+            ms = _uuid7_last_ms
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                ms = _uuid7_last_ms = ms + 1
+                _uuid7_counter = 0
+        else:
+            _uuid7_last_ms = ms
+            _uuid7_counter = int.from_bytes(os.urandom(2)) & 0x7FF
+        counter = _uuid7_counter
+    random_bits = int.from_bytes(os.urandom(8)) & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | random_bits)
+
+
+def generate_id():
+    """
+        Primary key default: UUIDv7 when ``TIME_ORDERED_IDS`` is on, UUIDv4 otherwise.
+    """
+    if getattr(settings, 'TIME_ORDERED_IDS', False):
+        return uuid7()
+    return uuid.uuid4()
+
 
 class DefaultModel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class ChangeTrackingMixin:
+    """
+        Remembers the column values a model instance was loaded with.
+
+        Lets callers save only what changed (``save(update_fields=...)``) and
+        lets the change history store compact diffs instead of whole rows.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self):
+        """
+            Returns the names of concrete fields changed since the instance was loaded.
+
+            Returns:
+                list: Field names, or ``None`` if the instance was not loaded from the database.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname])
+        ]
+
+    def reset_loaded_values(self):
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields if field.attname in self.__dict__
+        }
+
+
+class VersionedModel(models.Model):
+    """
+        Row version for optimistic concurrency, bumped on every save of an existing row.
+
+        Offline clients send the version they edited; a write against any other
+        version is a conflict (see ``referral_system_database.sync``).
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+
+
+def archive_model(model, date_field):
+    """
+        Builds the cold-storage twin of ``model``.
+
+        The archive table has the same columns under ``<table>_archive`` plus
+        ``archived_at``. Relations keep their column but lose the database
+        constraint and reverse accessor, so archived rows never block deletes of
+        the rows they point to; timestamps are copied as they were.
+
+        Args:
+            model (Model): Hot model to mirror.
+            date_field (str): Field the retention horizon is measured on; indexed.
+    """
+    attrs = {
+        '__module__': model.__module__,
+        '__doc__': f'Archived rows of ``{model.__name__}``.',
+        'archived_at': models.DateTimeField(default=timezone.now),
+    }
+    for field in model._meta.concrete_fields:
+        if field.is_relation:
+            attrs[field.name] = models.ForeignKey(
+                field.remote_field.model, on_delete=models.DO_NOTHING, db_constraint=False,
+                related_name='+', null=field.null, blank=field.blank,
+            )
+            continue
+        name, _, args, kwargs = field.deconstruct()
+        kwargs.pop('auto_now', None)
+        kwargs.pop('auto_now_add', None)
+        field_class = models.IntegerField if isinstance(field, models.AutoField) else type(field)
+        attrs[name] = field_class(*args, **kwargs)
+    attrs['Meta'] = type('Meta', (), {
+        'db_table': f'{model._meta.db_table}_archive',
+        'indexes': [models.Index(fields=[date_field], name=f'{model._meta.model_name[:21]}_archived')],
+    })
+    return type(f'Archived{model.__name__}', (models.Model,), attrs)
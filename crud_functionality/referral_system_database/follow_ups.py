@@ -0,0 +1,166 @@
+"""
+Follow-up call scheduling.
+
+Each referral has a ``FollowUpSchedule`` row whose ``next_call_at`` is derived
+from the referral time and its calls so far:
+
+* no call yet: ``FOLLOW_UP_FIRST_CALL_HOURS`` after the referral;
+* answered, patient healthy / deceased / declined: no further call;
+* answered otherwise: ``FOLLOW_UP_REPEAT_DAYS`` after that call;
+* unanswered: ``FOLLOW_UP_RETRY_HOURS`` later, until ``FOLLOW_UP_MAX_UNANSWERED``
+  calls in a row went unanswered.
+
+The row is recomputed whenever a follow-up is written, so finding due work is a
+range scan on ``next_call_at``. Callers lease batches of due referrals; a lease
+ends when the call is logged, when the caller releases it, or after
+``FOLLOW_UP_LEASE_MINUTES``, and no two callers ever hold the same referral.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from referral_system_database.models import ArchivedCaseFollowUp, CaseFollowUp, FollowUpSchedule, Referral
+
+CLOSING_PATIENT_STATUSES = ('HEALTHY', 'DEMISE', 'DECLINED-TO-TALK')
+
+
+def next_call(referral_datetime, calls):
+    """
+        Works out when a referral is next due for a call.
+
+        Args:
+            referral_datetime (datetime): When the referral was made.
+            calls (list): ``(call_date, call_answered, patient_status)`` tuples, oldest first.
+
+        Returns:
+            tuple: ``(next_call_at, last_call_at, unanswered_calls)``.
+    """
+    if not calls:
+        return referral_datetime + timedelta(hours=getattr(settings, 'FOLLOW_UP_FIRST_CALL_HOURS', 24)), None, 0
+    last_call_at, answered, patient_status = calls[-1]
+    if answered:
+        if patient_status in CLOSING_PATIENT_STATUSES:
+            return None, last_call_at, 0
+        return last_call_at + timedelta(days=getattr(settings, 'FOLLOW_UP_REPEAT_DAYS', 3)), last_call_at, 0
+
+    unanswered = 0
+    for _, answered, _ in reversed(calls):
+        if answered:
+            break
+        unanswered += 1
+    if unanswered >= getattr(settings, 'FOLLOW_UP_MAX_UNANSWERED', 5):
+        return None, last_call_at, unanswered
+    return last_call_at + timedelta(hours=getattr(settings, 'FOLLOW_UP_RETRY_HOURS', 4)), last_call_at, unanswered
+
+
+def _calls(referral_ids):
+    calls = defaultdict(list)
+    # Archived calls still count: archiving must not put a referral back on the queue.
+    for model in (CaseFollowUp, ArchivedCaseFollowUp):
+        rows = model.objects.filter(case_status_id__in=referral_ids).values_list(
+            'case_status_id', 'call_date', 'call_answered', 'patient_status'
+        )
+        for referral_id, *call in rows:
+            calls[referral_id].append(tuple(call))
+    for referral_calls in calls.values():
+        referral_calls.sort(key=lambda call: call[0])
+    return calls
+
+
+def reschedule(referral_ids, end_leases=False):
+    """
+        Recomputes the schedules of the given referrals.
+
+        Args:
+            referral_ids (iterable): Referrals to recompute.
+            end_leases (bool): Also hand the referrals back to the queue, once
+                their follow-up call was logged. Other changes keep the caller's lease.
+    """
+    referrals = dict(Referral.objects.filter(pk__in=set(referral_ids)).values_list('pk', 'datetime'))
+    if not referrals:
+        return
+    calls = _calls(list(referrals))
+    schedules = []
+    for referral_id, referral_datetime in referrals.items():
+        next_call_at, last_call_at, unanswered = next_call(referral_datetime, calls.get(referral_id, []))
+        schedules.append(FollowUpSchedule(
+            referral_id=referral_id, next_call_at=next_call_at, last_call_at=last_call_at,
+            unanswered_calls=unanswered, leased_to=None, lease_expires_at=None,
+        ))
+    update_fields = ['next_call_at', 'last_call_at', 'unanswered_calls']
+    if end_leases:
+        update_fields += ['leased_to', 'lease_expires_at']
+    FollowUpSchedule.objects.bulk_create(
+        schedules, update_conflicts=True, unique_fields=['referral'], update_fields=update_fields,
+    )
+
+
+def _schedules(within):
+    schedules = FollowUpSchedule.objects.all()
+    return schedules if within is None else schedules.filter(within)
+
+
+def leased_calls(caller, now=None, within=None):
+    """
+        Returns the schedules currently leased to ``caller``, most overdue first.
+
+        Args:
+            within (Q): Only schedules matching this predicate, e.g. the caller's scope.
+    """
+    return _schedules(within).filter(
+        leased_to=caller, lease_expires_at__gt=now or timezone.now(),
+    ).select_related('referral').order_by('next_call_at')
+
+
+def claim_calls(caller, limit=10, within=None):
+    """
+        Leases due referrals to ``caller``, most overdue first.
+
+        Referrals the caller already holds count towards ``limit`` and have
+        their lease extended, so asking again returns the same batch.
+
+        Args:
+            within (Q): Only lease schedules matching this predicate, e.g. the caller's scope.
+
+        Returns:
+            list: The caller's leased schedules, with their referrals.
+    """
+    now = timezone.now()
+    expires = now + timedelta(minutes=getattr(settings, 'FOLLOW_UP_LEASE_MINUTES', 15))
+    held = _schedules(within).filter(leased_to=caller, lease_expires_at__gt=now)
+    held.update(lease_expires_at=expires)
+    wanted = limit - held.count()
+
+    if wanted > 0:
+        free = Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+        due = _schedules(within).filter(free, next_call_at__lte=now).order_by('next_call_at')
+        alias = due.db
+        if connections[alias].features.has_select_for_update_skip_locked:
+            with transaction.atomic(using=alias):
+                ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:wanted])
+                FollowUpSchedule.objects.using(alias).filter(pk__in=ids).update(leased_to=caller, lease_expires_at=expires)
+        else:
+            # As in jobs.claim(): the conditional UPDATE lets one caller win each referral.
+            claimed = 0
+            for pk in due.values_list('pk', flat=True)[:wanted * 4]:
+                claimed += FollowUpSchedule.objects.using(alias).filter(free, pk=pk).update(
+                    leased_to=caller, lease_expires_at=expires
+                )
+                if claimed == wanted:
+                    break
+
+    return list(leased_calls(caller, now, within)[:limit])
+
+
+def release_calls(caller, referral_ids=None, within=None):
+    """
+        Hands the caller's leased referrals (or only ``referral_ids``) back to the queue.
+    """
+    leased = _schedules(within).filter(leased_to=caller)
+    if referral_ids is not None:
+        leased = leased.filter(pk__in=referral_ids)
+    return leased.update(leased_to=None, lease_expires_at=None)
@@ -0,0 +1,232 @@
+"""
+Change history for hospitals, staff users and referrals.
+
+Saves of tracked models are diffed against the values the instance was loaded
+with (``ChangeTrackingMixin``) and only the changed fields are stored, as
+``{field: [old, new]}``, in the append-only ``ChangeHistory`` table. Entries are
+queued when their transaction commits and written with one ``bulk_create`` at
+the end of the request by ``ChangeHistoryMiddleware`` (immediately outside a
+request). Any past state can be rebuilt by walking the diffs back from the
+current row.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from referral_system_database.models import ChangeHistory, Hospital, Referral, StaffUser
+
+MASKED = '***'
+
+# Tracked models and the fields whose values must not be stored.
+TRACKED_MODELS = {
+    Hospital: set(),
+    Referral: set(),
+    StaffUser: {'password'},
+}
+
+# Fields whose changes are not worth an entry.
+IGNORED_FIELDS = {
+    StaffUser: {'last_login'},
+}
+
+_actor = ContextVar('history_actor', default=None)
+_batch = ContextVar('history_batch', default=None)
+
+
+@contextmanager
+def history_actor(user):
+    """
+        Attributes changes made inside the block to ``user``.
+    """
+    token = _actor.set(user if user is not None and user.is_authenticated else None)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+@contextmanager
+def history_batch():
+    """
+        Collects committed entries and writes them in one insert on exit.
+    """
+    batch = []
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        if batch:
+            ChangeHistory.objects.bulk_create(batch)
+
+
+class ChangeHistoryMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with history_batch():
+            return self.get_response(request)
+
+
+def _jsonable(value):
+    if isinstance(value, FieldFile):
+        return value.name or None
+    return value
+
+
+def snapshot(instance):
+    """
+        Returns the instance's concrete field values keyed by field name.
+    """
+    masked = TRACKED_MODELS.get(type(instance), set())
+    return {
+        field.name: None if field.name in masked else _jsonable(field.value_from_object(instance))
+        for field in instance._meta.concrete_fields
+    }
+
+
+def creation_changes(instance):
+    return {name: [None, value] for name, value in snapshot(instance).items() if value not in (None, '')}
+
+
+def diff(instance, update_fields=None):
+    """
+        Returns ``{field: [old, new]}`` for the fields changed by the last save.
+    """
+    model = type(instance)
+    masked = TRACKED_MODELS.get(model, set())
+    ignored = IGNORED_FIELDS.get(model, set())
+    loaded = getattr(instance, '_loaded_values', None)
+    names = instance.changed_fields() if loaded is not None else [
+        field.name for field in instance._meta.concrete_fields
+    ]
+    if update_fields is not None:
+        names = [name for name in names if name in update_fields]
+
+    changes = {}
+    for name in names:
+        if name in ignored:
+            continue
+        field = instance._meta.get_field(name)
+        if name in masked:
+            changes[name] = [MASKED, MASKED]
+            continue
+        old = loaded.get(field.attname) if loaded is not None else None
+        changes[name] = [_jsonable(old), _jsonable(field.value_from_object(instance))]
+    return changes
+
+
+def _enqueue(entry):
+    batch = _batch.get()
+    if batch is None:
+        ChangeHistory.objects.bulk_create([entry])
+    else:
+        batch.append(entry)
+
+
+def record(instance, action, changes):
+    """
+        Queues a history entry once the surrounding transaction commits.
+    """
+    actor = _actor.get()
+    entry = ChangeHistory(
+        model_label=instance._meta.label_lower,
+        object_id=str(instance.pk),
+        action=action,
+        changes=changes,
+        changed_at=timezone.now(),
+        changed_by_id=actor.pk if actor is not None else None,
+    )
+    transaction.on_commit(lambda: _enqueue(entry), using=instance._state.db)
+
+
+def record_m2m_change(instance, field_name, old_ids, new_ids):
+    old_ids, new_ids = sorted(map(str, old_ids)), sorted(map(str, new_ids))
+    if old_ids != new_ids:
+        record(instance, 'UPDATE', {field_name: [old_ids, new_ids]})
+
+
+def entries_for(model, object_id):
+    return ChangeHistory.objects.filter(model_label=model._meta.label_lower, object_id=str(object_id))
+
+
+def reconstruct(model, object_id, as_of):
+    """
+        Rebuilds the field values an object had at ``as_of``.
+
+        Starts from the current row (or the snapshot stored when it was deleted)
+        and undoes every change made after ``as_of``, newest first.
+
+        Returns:
+            dict: Field values, or ``None`` if the object did not exist then.
+    """
+    instance = model.objects.filter(pk=object_id).first()
+    entries = entries_for(model, object_id)
+    if instance is not None:
+        state = snapshot(instance)
+        for field in model._meta.many_to_many:
+            state[field.name] = sorted(str(pk) for pk in getattr(instance, field.name).values_list('pk', flat=True))
+    else:
+        deleted = entries.filter(action='DELETE').order_by('-changed_at', '-id').first()
+        if deleted is None or deleted.changed_at <= as_of:
+            return None
+        state = dict(deleted.changes)
+
+    for entry in entries.filter(changed_at__gt=as_of).order_by('-changed_at', '-id'):
+        if entry.action == 'CREATE':
+            return None
+        if entry.action == 'UPDATE':
+            for name, (old, _) in entry.changes.items():
+                state[name] = old
+    return state
+
+
+class ChangeHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChangeHistory
+        fields = ['id', 'action', 'changes', 'changed_at', 'changed_by']
+
+
+class ChangeHistoryViewMixin:
+    """
+        Viewset mixin attributing writes to the request user and adding a
+        ``{pk}/history/`` route (``?as_of=`` returns the reconstructed state).
+    """
+
+    def perform_create(self, serializer):
+        with history_actor(self.request.user):
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with history_actor(self.request.user):
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with history_actor(self.request.user):
+            super().perform_destroy(instance)
+
+    @action(detail=True)
+    def history(self, request, pk=None):
+        instance = self.get_object()
+        model = type(instance)
+        if 'as_of' in request.query_params:
+            as_of = serializers.DateTimeField().to_internal_value(request.query_params['as_of'])
+            state = reconstruct(model, instance.pk, as_of)
+            if state is None:
+                raise ValidationError({'as_of': 'The object did not exist at that time.'})
+            return Response(state)
+
+        entries = entries_for(model, instance.pk).order_by('-changed_at', '-id')
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        return paginator.get_paginated_response(ChangeHistorySerializer(page, many=True).data)
@@ -0,0 +1,191 @@
+"""
+``Idempotency-Key`` support for create and update endpoints.
+
+A client that may retry a write sends a unique ``Idempotency-Key`` header with
+it. The first request claims the key by inserting an ``IdempotencyRecord`` (its
+primary key is the hash of the caller and the key, so the insert doubles as the
+lock) and stores the rendered response when it finishes. A retry with the same
+key and the same request replays the stored response without running the
+serializer or touching the database again; a concurrent duplicate waits up to
+``IDEMPOTENCY_WAIT_SECONDS`` for the first one and then replays it, or gets a
+409. Reusing a key for a different request is a 422.
+
+The view's writes and the stored response are committed in one transaction.
+Responses with a 5xx status and requests that raise (validation errors
+included) roll back and release the key, so the client can fix the request and
+retry with it. Records are kept for ``IDEMPOTENCY_TTL_HOURS`` and then purged
+by the ``idempotency.purge_expired`` task, which ``run_workers`` queues on the
+interval set in ``JOB_SCHEDULE``.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from referral_system_database.models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_key_in_progress'
+
+
+def request_fingerprint(request):
+    """
+        Hashes what makes a request "the same request": method, path, query and body.
+    """
+    try:
+        body = request._request.body
+    except RawPostDataException:
+        # The body stream was already consumed; fall back to the parsed data.
+        body = repr(sorted(request.data.items()) if hasattr(request.data, 'items') else request.data).encode()
+    digest = hashlib.sha256()
+    for part in (request.method, request.get_full_path(), request.content_type or ''):
+        digest.update(part.encode() + b'\0')
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def purge_expired(batch_size=1000):
+    """
+        Deletes expired records, ``batch_size`` rows per statement.
+
+        Returns:
+            int: Records deleted.
+    """
+    deleted = 0
+    while True:
+        expired = list(
+            IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not expired:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(pk__in=expired).delete()[0]
+
+
+def _claim(key_hash, fingerprint):
+    """
+        Takes the key for this request.
+
+        Returns:
+            IdempotencyRecord: ``None`` once claimed; otherwise the record of the
+                request that holds, or finished with, the key.
+    """
+    now = timezone.now()
+    lock_until = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60))
+    expires_at = now + timedelta(hours=getattr(settings, 'IDEMPOTENCY_TTL_HOURS', 24))
+    try:
+        with transaction.atomic():
+            IdempotencyRecord.objects.create(
+                key_hash=key_hash, fingerprint=fingerprint, locked_until=lock_until, expires_at=expires_at
+            )
+        return None
+    except IntegrityError:
+        pass
+
+    record = IdempotencyRecord.objects.filter(pk=key_hash).first()
+    if record is None:
+        # Purged in between; the next attempt inserts.
+        return _claim(key_hash, fingerprint)
+    stale = IdempotencyRecord.objects.filter(pk=key_hash, expires_at__lte=now)
+    if record.status_code is None and record.fingerprint == fingerprint:
+        # The first request's worker died without releasing the key.
+        stale = stale | IdempotencyRecord.objects.filter(pk=key_hash, status_code=None, locked_until__lte=now)
+    taken = stale.update(
+        fingerprint=fingerprint, status_code=None, content=b'', content_type='', location='',
+        locked_until=lock_until, expires_at=expires_at,
+    )
+    return None if taken else record
+
+
+def _replay(record):
+    response = HttpResponse(record.content, status=record.status_code, content_type=record.content_type or None)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class IdempotentWriteMixin:
+    """
+        View mixin honouring the ``Idempotency-Key`` header on ``create`` and ``update``.
+
+        Attributes:
+            idempotency_methods (tuple): HTTP methods the header is honoured for.
+    """
+    idempotency_methods = ('POST', 'PUT', 'PATCH')
+
+    def get_idempotency_scope(self, request):
+        user = request.user
+        return f'user:{user.pk}' if user and user.is_authenticated else 'anonymous'
+
+    def render_for_idempotency(self, request, response):
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        return response
+
+    def idempotent(self, handler, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in self.idempotency_methods:
+            return handler(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Ensure this header has no more than {MAX_KEY_LENGTH} characters.'})
+
+        key_hash = hashlib.sha256(f'{self.get_idempotency_scope(request)}|{key}'.encode()).hexdigest()
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+        while (record := _claim(key_hash, fingerprint)) is not None:
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if record.status_code is not None:
+                return _replay(record)
+            if time.monotonic() >= deadline:
+                error = IdempotencyKeyInProgress()
+                error.wait = max(int((record.locked_until - timezone.now()).total_seconds()), 1)
+                raise error
+            time.sleep(0.1)
+
+        try:
+            # The write and the stored response commit together: a crash in between
+            # cannot leave a write whose retry runs it again.
+            with transaction.atomic():
+                response = self.render_for_idempotency(request, handler(request, *args, **kwargs))
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    IdempotencyRecord.objects.filter(pk=key_hash).update(
+                        status_code=response.status_code,
+                        content=response.content,
+                        content_type=response.get('Content-Type', ''),
+                        location=response.get('Location', ''),
+                    )
+        except BaseException:
+            IdempotencyRecord.objects.filter(pk=key_hash).delete()
+            raise
+        if response.status_code >= 500:
+            IdempotencyRecord.objects.filter(pk=key_hash).delete()
+        return response
+
+    def create(self, request, *args, **kwargs):
+        return self.idempotent(super().create, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self.idempotent(super().update, request, *args, **kwargs)
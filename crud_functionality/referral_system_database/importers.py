@@ -0,0 +1,270 @@
+"""
+Streaming bulk import of master data (ICD catalogue, states, districts, blocks).
+
+Files are read row by row (CSV, NDJSON or a JSON array), validated in chunks,
+optionally across a process pool, and upserted by natural key with
+``bulk_create(update_conflicts=True)``. Only a bounded number of chunks is in
+flight at any time, so memory stays flat for catalogue-sized files.
+"""
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.db import transaction
+
+from referral_system_database.cache import bump_generation
+from referral_system_database.models import State, District, Block, MedicalCondition
+from referral_system_database.routing import routing
+
+
+@dataclass
+class ImportSpec:
+    """
+        How one kind of master row maps onto its model.
+
+        Attributes:
+            model (Model): Target model.
+            key (str): Natural key the upsert conflicts on.
+            fields (list): Model fields read from the file.
+            required (list): Fields that must be non-empty.
+            reference (tuple): ``(column, model, key field, model field)`` for a
+                parent looked up by its natural key, e.g. a district's state.
+    """
+    model: type
+    key: str
+    fields: list
+    required: list
+    reference: tuple = None
+
+    def rules(self):
+        rules = []
+        for name in self.fields:
+            model_field = self.model._meta.get_field(name)
+            required = name in self.required
+            if model_field.has_default():
+                empty = model_field.get_default()
+            elif model_field.null:
+                empty = None
+            elif model_field.get_internal_type() == 'BooleanField':
+                empty = False
+            elif model_field.empty_strings_allowed:
+                empty = ''
+            else:
+                # A NOT NULL column with nothing to fall back on.
+                required, empty = True, None
+            rules.append((name, required, model_field.get_internal_type(), model_field.max_length, empty))
+        if self.reference:
+            rules.append((self.reference[0], True, 'CharField', None, None))
+        return rules
+
+
+IMPORT_SPECS = {
+    'conditions': ImportSpec(
+        model=MedicalCondition, key='icd',
+        fields=['icd', 'name', 'head_name', 'sub_head_name', 'diagnosis', 'status'],
+        required=['icd', 'name'],
+    ),
+    'states': ImportSpec(
+        model=State, key='num_code',
+        fields=['num_code', 'state_name'],
+        required=['num_code', 'state_name'],
+    ),
+    'districts': ImportSpec(
+        model=District, key='district_num_code',
+        fields=['district_num_code', 'district_name'],
+        required=['district_num_code', 'district_name'],
+        reference=('state_num_code', State, 'num_code', 'state'),
+    ),
+    'blocks': ImportSpec(
+        model=Block, key='block_num_code',
+        fields=['block_num_code', 'block_name'],
+        required=['block_num_code', 'block_name'],
+        reference=('district_num_code', District, 'district_num_code', 'district'),
+    ),
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    upserted: int = 0
+    rejected: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def read_rows(path, file_format=None):
+    """
+        Yields the rows of a CSV, NDJSON or JSON array file as dicts.
+    """
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if file_format == 'csv':
+            yield from csv.DictReader(handle)
+        elif file_format in ('ndjson', 'jsonl'):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        elif file_format == 'json':
+            yield from _iter_json_array(handle)
+        else:
+            raise ValueError(f'Unsupported file format: {file_format}')
+
+
+def _iter_json_array(handle, read_size=1 << 16):
+    """
+        Decodes the items of a top-level JSON array without loading the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = handle.read(read_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = handle.read(read_size)
+            if not more:
+                raise
+            buffer += more
+            continue
+        yield item
+        buffer = buffer[end:]
+        if len(buffer) < read_size:
+            buffer += handle.read(read_size)
+
+
+def validate_chunk(rules, rows):
+    """
+        Cleans a chunk of raw rows. Pure function, so it can run in a worker process.
+
+        Args:
+            rules (list): ``(field, required, internal type, max length, empty value)`` tuples.
+            rows (list): ``(line number, raw dict)`` pairs.
+
+        Returns:
+            tuple: ``(valid, rejected)`` lists of ``(line number, cleaned dict)``
+            and ``(line number, error message)``.
+    """
+    valid, rejected = [], []
+    for line, raw in rows:
+        cleaned, errors = {}, []
+        for name, required, internal_type, max_length, empty in rules:
+            value = raw.get(name)
+            value = value.strip() if isinstance(value, str) else value
+            if value in (None, ''):
+                if required:
+                    errors.append(f'{name} is required')
+                # Empty optional columns store what the model would: NOT NULL text columns get ''.
+                cleaned[name] = empty
+                continue
+            if internal_type == 'BooleanField':
+                value = value if isinstance(value, bool) else str(value).lower() in TRUE_VALUES
+            else:
+                value = str(value)
+                if max_length and len(value) > max_length:
+                    errors.append(f'{name} is longer than {max_length} characters')
+            cleaned[name] = value
+        if errors:
+            rejected.append((line, '; '.join(errors)))
+        else:
+            valid.append((line, cleaned))
+    return valid, rejected
+
+
+def _chunks(rows, size):
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _validated_chunks(rules, chunks, workers):
+    if workers <= 1:
+        for chunk in chunks:
+            yield len(chunk), validate_chunk(rules, chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(validate_chunk, rules, chunk)))
+            # Keep a bounded number of chunks in flight to cap memory.
+            if len(pending) >= workers * 2:
+                size, future = pending.popleft()
+                yield size, future.result()
+        while pending:
+            size, future = pending.popleft()
+            yield size, future.result()
+
+
+def _upsert(spec, valid, rejected, dry_run):
+    # Last occurrence wins; one statement cannot upsert the same key twice.
+    by_key = {cleaned[spec.key]: (line, cleaned) for line, cleaned in valid}
+    if spec.reference:
+        column, parent_model, parent_key, model_field = spec.reference
+        codes = {cleaned[column] for _, cleaned in by_key.values()}
+        parents = dict(parent_model.objects.filter(**{f'{parent_key}__in': codes}).values_list(parent_key, 'pk'))
+        for key, (line, cleaned) in list(by_key.items()):
+            parent_id = parents.get(cleaned.pop(column))
+            if parent_id is None:
+                rejected.append((line, f'unknown {column}'))
+                del by_key[key]
+            else:
+                cleaned[f'{model_field}_id'] = parent_id
+
+    objects = [spec.model(**cleaned) for _, cleaned in by_key.values()]
+    if objects and not dry_run:
+        update_fields = [name for name in spec.fields if name != spec.key]
+        if spec.reference:
+            update_fields.append(spec.reference[3])
+        with transaction.atomic():
+            spec.model.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=[spec.key], update_fields=update_fields,
+            )
+    return len(objects)
+
+
+def import_masters(kind, path, file_format=None, chunk_size=1000, workers=1, dry_run=False):
+    """
+        Imports one master file.
+
+        Args:
+            kind (str): One of ``IMPORT_SPECS``.
+            path (str): File to read.
+            file_format (str): ``csv``, ``ndjson`` or ``json``; guessed from the extension.
+            chunk_size (int): Rows validated and written per batch.
+            workers (int): Processes used to validate chunks.
+            dry_run (bool): Validate and resolve references without writing.
+
+        Returns:
+            ImportReport: Counts, rejects and timing.
+    """
+    spec = IMPORT_SPECS[kind]
+    report = ImportReport()
+    started = time.perf_counter()
+    chunks = _chunks(read_rows(path, file_format), chunk_size)
+    for size, (valid, rejected) in _validated_chunks(spec.rules(), chunks, workers):
+        report.read += size
+        report.upserted += _upsert(spec, valid, rejected, dry_run)
+        report.rejected.extend(rejected)
+    if report.upserted and not dry_run:
+        # bulk_create() sends no post_save; do what the receivers would.
+        bump_generation(spec.model)
+        routing.invalidate()
+    report.seconds = time.perf_counter() - started
+    return report
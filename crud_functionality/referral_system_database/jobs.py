@@ -0,0 +1,297 @@
+"""
+Database-backed background jobs.
+
+Tasks are plain functions registered with :func:`task`; :func:`enqueue` stores a
+``Job`` row (inside the caller's transaction, so a job never runs for a rolled
+back change) and ``manage.py run_workers`` executes them in a pool of processes
+and threads.
+
+Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+supports it. On SQLite, which has no row locks, a job is claimed by a
+conditional ``UPDATE`` that re-checks it is still ready, so of several workers
+racing for a job exactly one wins. Claims are leases: a job whose worker died is
+picked up again once ``JOB_LEASE_SECONDS`` have passed. Failed runs are retried
+with exponential backoff until ``max_attempts`` is reached.
+
+Housekeeping tasks listed in ``JOB_SCHEDULE`` recur: ``run_workers`` keeps one
+pending job per task queued, due one interval after the previous run was.
+"""
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from referral_system_database.models import Job
+
+_registry = {}
+
+
+def task(name=None):
+    """
+        Registers a function as a task.
+
+        Args:
+            name (str): Name jobs refer to, defaults to ``module.function``.
+    """
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, priority=0, delay=None, max_attempts=5):
+    """
+        Queues a task run.
+
+        Args:
+            name (str | callable): Task name or the registered function.
+            payload (dict): JSON-serialisable keyword arguments for the task.
+            priority (int): Higher runs first.
+            delay (timedelta | float): Do not start before this much time (seconds) has passed.
+            max_attempts (int): Runs allowed before the job is marked failed.
+
+        Returns:
+            Job: The queued job.
+    """
+    run_at = timezone.now()
+    if delay:
+        run_at += delay if isinstance(delay, timedelta) else timedelta(seconds=delay)
+    return Job.objects.create(
+        name=getattr(name, 'task_name', name), payload=payload or {},
+        priority=priority, run_at=run_at, max_attempts=max_attempts,
+    )
+
+
+def schedule_recurring(now=None):
+    """
+        Queues the next run of every ``JOB_SCHEDULE`` task that has none pending.
+
+        A task is due ``interval`` seconds after its previous run was, or right
+        away when it never ran.
+
+        Returns:
+            list: The queued jobs.
+    """
+    schedule = getattr(settings, 'JOB_SCHEDULE', {})
+    if not schedule:
+        return []
+    now = now or timezone.now()
+    jobs = Job.objects.filter(name__in=list(schedule))
+    pending = set(jobs.filter(status__in=('QUEUED', 'RUNNING')).values_list('name', flat=True))
+    previous = dict(jobs.values('name').annotate(last=Max('run_at')).values_list('name', 'last'))
+    queued = []
+    for name, interval in schedule.items():
+        if name in pending:
+            continue
+        due = previous[name] + timedelta(seconds=interval) if name in previous else now
+        queued.append(enqueue(name, delay=max(due - now, timedelta(0))))
+    return queued
+
+
+def _schedule_loop(stop, interval):
+    try:
+        while not stop.is_set():
+            schedule_recurring()
+            stop.wait(interval)
+    finally:
+        connections.close_all()
+
+
+def _ready(now):
+    return Q(status='QUEUED', run_at__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+
+
+def claim(worker_id, limit=1):
+    """
+        Leases up to ``limit`` ready jobs to ``worker_id``, highest priority first.
+
+        Returns:
+            list: The claimed jobs.
+    """
+    now = timezone.now()
+    claimed = {
+        'status': 'RUNNING',
+        'locked_by': worker_id,
+        'locked_until': now + timedelta(seconds=getattr(settings, 'JOB_LEASE_SECONDS', 300)),
+        'started_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    ready = Job.objects.filter(_ready(now)).order_by('-priority', 'run_at', 'id')
+    alias = ready.db
+
+    if connections[alias].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=alias):
+            ids = list(ready.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.using(alias).filter(pk__in=ids).update(**claimed)
+    else:
+        # Autocommit on purpose: a read that later upgrades to a write is
+        # what makes concurrent SQLite transactions fail with "database is locked".
+        ids = []
+        for pk in ready.values_list('pk', flat=True)[:limit * 4]:
+            if Job.objects.using(alias).filter(_ready(now), pk=pk).update(**claimed):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    if not ids:
+        return []
+    return list(Job.objects.using(alias).filter(pk__in=ids).order_by('-priority', 'run_at', 'id'))
+
+
+def retry_delay(attempts):
+    """
+        Seconds to wait before the next attempt: exponential, capped and jittered.
+    """
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 10)
+    cap = getattr(settings, 'JOB_RETRY_MAX_SECONDS', 3600)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class WorkerMetrics:
+    """
+        Thread-safe counters for the jobs run by one process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'claimed': 0, 'done': 0, 'retried': 0, 'failed': 0}
+        self._busy_seconds = 0.0
+
+    def incr(self, key, count=1, seconds=0.0):
+        with self._lock:
+            self._counts[key] += count
+            self._busy_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            finished = self._counts['done'] + self._counts['retried'] + self._counts['failed']
+            return {
+                **self._counts,
+                'busy_seconds': round(self._busy_seconds, 3),
+                'avg_seconds': round(self._busy_seconds / finished, 3) if finished else 0.0,
+            }
+
+
+def queue_stats():
+    """
+        Returns job counts by status and how long the oldest ready job has waited.
+    """
+    now = timezone.now()
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+    oldest = Job.objects.filter(status='QUEUED', run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        **{status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'oldest_ready_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
+
+
+def run_job(job, worker_id, metrics=None):
+    """
+        Runs one claimed job and records its outcome.
+    """
+    started = time.perf_counter()
+    func = _registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'No task registered as {job.name!r}.')
+        result = func(**job.payload)
+    except Exception:
+        elapsed = time.perf_counter() - started
+        if job.attempts >= job.max_attempts:
+            outcome = 'failed'
+            update = {'status': 'FAILED', 'finished_at': timezone.now()}
+        else:
+            outcome = 'retried'
+            update = {'status': 'QUEUED', 'run_at': timezone.now() + timedelta(seconds=retry_delay(job.attempts))}
+        update.update(last_error=traceback.format_exc(), locked_by='', locked_until=None)
+    else:
+        elapsed = time.perf_counter() - started
+        outcome = 'done'
+        update = {'status': 'DONE', 'result': result, 'finished_at': timezone.now(), 'locked_by': '', 'locked_until': None}
+    # A worker whose lease ran out must not overwrite the job's new owner.
+    Job.objects.filter(pk=job.pk, locked_by=worker_id).update(**update)
+    if metrics is not None:
+        metrics.incr(outcome, seconds=elapsed)
+    return outcome
+
+
+class Worker:
+    """
+        Claims and runs jobs in a loop until ``stop`` is set.
+
+        Args:
+            worker_id (str): Identifies the worker in ``Job.locked_by``.
+            batch_size (int): Jobs claimed per round trip.
+            poll_interval (float): Seconds to sleep when no job is ready.
+            metrics (WorkerMetrics): Shared counters.
+    """
+
+    def __init__(self, worker_id, batch_size=1, poll_interval=1.0, metrics=None):
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.metrics = metrics or WorkerMetrics()
+
+    def run(self, stop, once=False):
+        try:
+            while not stop.is_set():
+                jobs = claim(self.worker_id, self.batch_size)
+                if not jobs:
+                    if once:
+                        return
+                    stop.wait(self.poll_interval)
+                    continue
+                self.metrics.incr('claimed', len(jobs))
+                for job in jobs:
+                    run_job(job, self.worker_id, self.metrics)
+        finally:
+            # Connections are per thread; do not leave this one open.
+            connections.close_all()
+
+
+def serve(threads=1, batch_size=1, poll_interval=1.0, once=False, schedule=False):
+    """
+        Runs ``threads`` workers in this process until SIGINT/SIGTERM.
+
+        Args:
+            schedule (bool): Also queue the recurring ``JOB_SCHEDULE`` tasks; one
+                process per deployment is enough.
+
+        Returns:
+            dict: The process' metrics.
+    """
+    autodiscover_modules('tasks')
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+    metrics = WorkerMetrics()
+    prefix = f'{socket.gethostname()}:{os.getpid()}'
+    pool = [
+        threading.Thread(
+            target=Worker(f'{prefix}:{index}', batch_size, poll_interval, metrics).run,
+            args=(stop, once), name=f'job-worker-{index}',
+        )
+        for index in range(threads)
+    ]
+    if schedule and once:
+        schedule_recurring()
+    elif schedule:
+        pool.append(threading.Thread(target=_schedule_loop, args=(stop, poll_interval), name='job-scheduler'))
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return metrics.snapshot()
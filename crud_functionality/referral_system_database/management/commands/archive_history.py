@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from referral_system_database.archive import ARCHIVE_POLICIES, archive_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves case statuses, follow-ups and logs of closed cases older than the retention '
+        'horizon into the archive tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', choices=sorted(ARCHIVE_POLICIES), help='Defaults to all.')
+        parser.add_argument('--days', type=int, help='Retention horizon, defaults to ARCHIVE_HORIZON_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move.')
+
+    def handle(self, *args, **options):
+        for kind in options['kinds'] or sorted(ARCHIVE_POLICIES):
+            report = archive_history(kind, options['days'], options['batch_size'], options['dry_run'])
+            verb = 'would move' if options['dry_run'] else 'moved'
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: {verb} {report.moved} rows in {report.batches} batches ({report.seconds:.2f}s)'
+            ))
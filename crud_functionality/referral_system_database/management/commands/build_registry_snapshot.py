@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from referral_system_database.registry import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Builds a new version of the offline registry bundle if the registry tables changed.'
+
+    def handle(self, *args, **options):
+        snapshot, created = build_snapshot()
+        rows = sum(snapshot.tables.values())
+        state = 'built' if created else 'unchanged, kept'
+        self.stdout.write(self.style.SUCCESS(
+            f'Registry {state} version {snapshot.pk}: {rows} rows, {len(snapshot.bundle)} bytes'
+        ))
@@ -0,0 +1,44 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from referral_system_database.importers import IMPORT_SPECS, import_masters
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk upserts master data (ICD conditions, states, districts, blocks) from a CSV, '
+        'NDJSON or JSON array file, keyed by natural code.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_SPECS))
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson', 'json'])
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes used to validate chunks.')
+        parser.add_argument('--rejects', help='Write rejected rows (row number, error) to this CSV file.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            report = import_masters(
+                options['kind'], options['path'], options['file_format'],
+                chunk_size=options['chunk_size'], workers=options['workers'], dry_run=options['dry_run'],
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['row', 'error'])
+                writer.writerows(sorted(report.rejected))
+        for row, error in sorted(report.rejected)[:20]:
+            self.stderr.write(f'row {row}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.read} rows read, {report.upserted} upserted, {len(report.rejected)} rejected '
+            f'in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)'
+            + (' [dry run]' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,45 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from referral_system_database.importers import read_rows
+from referral_system_database.models import StaffUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates staff users from a CSV, NDJSON or JSON array file. Work role, speciality, experts and '
+        'incharge roles are given by name, place of posting by hospital id; experts and incharge roles '
+        'are separated by ";".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson', 'json'])
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes used to hash passwords.')
+        parser.add_argument('--rejects', help='Write rejected rows (row number, error) to this CSV file.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            report = StaffUser.objects.bulk_create_users(
+                read_rows(options['path'], options['file_format']),
+                workers=options['workers'], dry_run=options['dry_run'],
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['row', 'error'])
+                writer.writerows(report.rejected)
+        for row, error in report.rejected[:20]:
+            self.stderr.write(f'row {row}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.read} rows read, {report.created} users created, {len(report.rejected)} rejected '
+            f'in {report.seconds:.2f}s ({report.hash_seconds:.2f}s hashing, {report.users_per_second:.1f} users/s)'
+            + (' [dry run]' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from referral_system_database.follow_ups import reschedule
+from referral_system_database.models import Referral
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every referral\'s follow-up schedule, e.g. after changing the FOLLOW_UP_* settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(Referral.objects.values_list('pk', flat=True))
+        for start in range(0, len(ids), options['batch_size']):
+            reschedule(ids[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f'{len(ids)} follow-up schedules rebuilt.'))
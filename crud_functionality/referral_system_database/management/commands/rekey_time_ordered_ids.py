@@ -0,0 +1,171 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, UUIDField, Value, When
+from django.utils import timezone
+
+from referral_system_database.cache import bump_generation
+from referral_system_database.default import DefaultModel, uuid7
+from referral_system_database.models import ChangeHistory, IdempotencyRecord, RegistrySnapshot
+
+# Field holding each model's creation time, used to give old rows ids in the right order.
+# CaseStatus.datetime is the last-modified time, so case statuses use the change history.
+TIMESTAMP_FIELDS = {
+    'referral': 'datetime',
+    'casefollowup': 'call_date',
+}
+
+
+def _remap(queryset, column, mapping, output_field):
+    whens = [When(**{column: old}, then=Value(new, output_field=output_field)) for old, new in mapping]
+    return queryset.filter(**{f'{column}__in': [old for old, _ in mapping]}).update(**{column: Case(*whens)})
+
+
+def _remap_value(value, mapping):
+    if isinstance(value, list):
+        return sorted(mapping.get(item, item) for item in value)
+    return mapping.get(value, value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Replaces the random UUIDv4 primary keys of a DefaultModel with time-ordered UUIDv7 ids, '
+        'updating every foreign key, many-to-many row and change history entry pointing at them, '
+        'including the ids recorded inside the history so past states still reconstruct. '
+        'Stored idempotent responses and offline registry versions embed the old ids and are deleted: '
+        'retried writes run again and field clients download a full registry snapshot. '
+        'Runs in one transaction; stop the application servers first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model name, e.g. referral or hospital.')
+        parser.add_argument(
+            '--timestamp-field',
+            help='Field whose value becomes the id timestamp. Without one, the creation time recorded '
+                 'in the change history is used where there is one, else the current time.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--sign-out-users', action='store_true',
+            help='Allow re-keying the user model. Issued tokens and sessions carry the old ids, '
+                 'so every user has to sign in again.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model('referral_system_database', options['model'])
+        except LookupError as error:
+            raise CommandError(error)
+        if not issubclass(model, DefaultModel):
+            raise CommandError(f'{model.__name__} does not use DefaultModel ids.')
+        if model._meta.label == settings.AUTH_USER_MODEL and not options['sign_out_users']:
+            raise CommandError(
+                f'Re-keying {model.__name__} invalidates every issued token (user_id claim) and session; '
+                f'pass --sign-out-users to do it anyway.'
+            )
+        timestamp_field = options['timestamp_field'] or TIMESTAMP_FIELDS.get(model._meta.model_name)
+        if timestamp_field:
+            try:
+                field = model._meta.get_field(timestamp_field)
+            except FieldDoesNotExist as error:
+                raise CommandError(error)
+            if getattr(field, 'auto_now', False):
+                raise CommandError(f'{model.__name__}.{timestamp_field} is a last-modified time, not a creation time.')
+
+        referencing = [
+            (related_model, field)
+            for related_model in apps.get_models(include_auto_created=True)
+            for field in related_model._meta.concrete_fields
+            if field.is_relation and field.related_model is model
+        ]
+        # Read every key up front: the table is rewritten while we go.
+        if timestamp_field:
+            rows = list(model.objects.order_by(timestamp_field, 'pk').values_list('pk', timestamp_field))
+        else:
+            created = dict(ChangeHistory.objects.filter(
+                model_label=model._meta.label_lower, action='CREATE',
+            ).values_list('object_id', 'changed_at'))
+            rows = sorted(
+                ((pk, created.get(str(pk))) for pk in model.objects.values_list('pk', flat=True)),
+                key=lambda row: (row[1] is None, row[1] or 0, row[0]),
+            )
+
+        output_field = UUIDField()
+        now = timezone.now()
+        rekeyed = 0
+        mapping = {}
+        with transaction.atomic():
+            # Foreign keys are deferred, so they are checked once, at commit.
+            batch = []
+            for pk, created in rows:
+                stamp = created or now
+                batch.append((pk, uuid7(int(stamp.timestamp() * 1000))))
+                if len(batch) == options['batch_size']:
+                    rekeyed += self._rekey(model, referencing, batch, output_field)
+                    mapping.update((str(old), str(new)) for old, new in batch)
+                    batch = []
+            if batch:
+                rekeyed += self._rekey(model, referencing, batch, output_field)
+                mapping.update((str(old), str(new)) for old, new in batch)
+            entries = self._rekey_history(model, referencing, mapping, options['batch_size'])
+            # Both store rendered responses carrying the old ids.
+            IdempotencyRecord.objects.all().delete()
+            RegistrySnapshot.objects.all().delete()
+
+        for changed in {model, *(related_model for related_model, _ in referencing)}:
+            bump_generation(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'{rekeyed} {model._meta.verbose_name_plural} re-keyed; '
+            f'{len(referencing)} referencing columns and {entries} history entries updated.'
+        ))
+
+    def _rekey(self, model, referencing, mapping, output_field):
+        _remap(model._base_manager.all(), model._meta.pk.attname, mapping, output_field)
+        for related_model, field in referencing:
+            _remap(related_model._base_manager.all(), field.attname, mapping, output_field)
+        _remap(
+            ChangeHistory.objects.filter(model_label=model._meta.label_lower), 'object_id',
+            [(str(old), str(new)) for old, new in mapping], ChangeHistory._meta.get_field('object_id'),
+        )
+        return len(mapping)
+
+    def _rekey_history(self, model, referencing, mapping, batch_size):
+        """
+            Rewrites the old ids recorded in ``ChangeHistory.changes``, which
+            ``history.reconstruct()`` replays as field values.
+
+            Returns:
+                int: Number of entries updated.
+        """
+        # Model label -> names of the fields holding ids of ``model``.
+        fields = {model._meta.label_lower: {model._meta.pk.name}}
+        for related_model, field in referencing:
+            if not related_model._meta.auto_created:
+                fields.setdefault(related_model._meta.label_lower, set()).add(field.name)
+        for related_model in apps.get_models():
+            for field in related_model._meta.many_to_many:
+                if field.related_model is model:
+                    fields.setdefault(related_model._meta.label_lower, set()).add(field.name)
+
+        updated = 0
+        stale = []
+        for entry in ChangeHistory.objects.filter(model_label__in=fields).only('model_label', 'action', 'changes').iterator():
+            changes = {}
+            for name, value in entry.changes.items():
+                if name not in fields[entry.model_label]:
+                    changes[name] = value
+                elif entry.action == 'DELETE':
+                    changes[name] = _remap_value(value, mapping)
+                else:
+                    changes[name] = [_remap_value(side, mapping) for side in value]
+            if changes != entry.changes:
+                entry.changes = changes
+                stale.append(entry)
+            if len(stale) == batch_size:
+                updated += ChangeHistory.objects.bulk_update(stale, ['changes'])
+                stale = []
+        if stale:
+            updated += ChangeHistory.objects.bulk_update(stale, ['changes'])
+        return updated
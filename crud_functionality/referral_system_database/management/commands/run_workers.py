@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+import queue
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from referral_system_database.jobs import queue_stats, serve
+
+
+def _serve_process(results, threads, batch_size, poll_interval, once, schedule):
+    results.put(serve(threads, batch_size, poll_interval, once, schedule))
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs background jobs queued with referral_system_database.jobs.enqueue(), and queues the '
+        'recurring tasks of JOB_SCHEDULE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1, help='Worker threads per process.')
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed per round trip.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is ready.')
+        parser.add_argument('--stats', action='store_true', help='Print queue statistics and exit.')
+        parser.add_argument(
+            '--no-schedule', action='store_true',
+            help='Do not queue JOB_SCHEDULE tasks, e.g. on all but one host.',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_stats(), indent=2))
+            return
+
+        worker_args = (options['threads'], options['batch_size'], options['poll_interval'], options['once'])
+        schedule = not options['no_schedule']
+        if options['processes'] <= 1:
+            metrics = [serve(*worker_args, schedule)]
+        else:
+            metrics = self._run_processes(options['processes'], worker_args, schedule)
+
+        totals = {key: sum(item[key] for item in metrics) for key in ('claimed', 'done', 'retried', 'failed')}
+        busy = sum(item['busy_seconds'] for item in metrics)
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['claimed']} jobs claimed: {totals['done']} done, {totals['retried']} retried, "
+            f"{totals['failed']} failed, {busy:.2f}s busy"
+        ))
+
+    def _run_processes(self, count, worker_args, schedule):
+        # Forked children must not share the parent's database sockets.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        # The first process alone queues the recurring tasks.
+        processes = [
+            context.Process(target=_serve_process, args=(results, *worker_args, schedule and index == 0))
+            for index in range(count)
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        metrics = []
+        while len(metrics) < count and any(process.is_alive() for process in processes):
+            try:
+                metrics.append(results.get(timeout=1))
+            except queue.Empty:
+                continue
+        for process in processes:
+            process.join()
+        return metrics
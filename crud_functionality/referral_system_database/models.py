@@ -1,11 +1,12 @@
 import uuid
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
-from .default import DefaultModel
+from .default import DefaultModel, ChangeTrackingMixin, VersionedModel, archive_model
 from .creation_models.location_models import State, Block, District
 from .creation_models.medical_models import  ProgramMaster, MedicalCondition, Expert
 from .creation_models.master_models import Empanelments, HospitalType, Incharges, WorkRole, Employer, ServiceCadre, Speciality, TrainingProvider, Position
@@ -59,6 +60,21 @@ class StaffUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def bulk_create_users(self, rows, workers=1, dry_run=False):
+        """
+            Creates many staff users at once (see ``referral_system_database.onboarding``).
+
+            Args:
+                rows (iterable): One dict per user, as read from an onboarding file.
+                workers (int): Processes used to hash passwords.
+                dry_run (bool): Only validate the rows.
+
+            Returns:
+                OnboardingReport: Counts, rejected rows and timing.
+        """
+        from referral_system_database.onboarding import onboard_staff
+        return onboard_staff(rows, workers=workers, dry_run=dry_run)
+
     def create_site_admin(self, email, password=None, **extra_fields):
         extra_fields.setdefault('role', 'SITE_ADMIN')
         extra_fields.setdefault('is_staff', True)
@@ -75,7 +91,7 @@ class StaffUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class StaffUser(DefaultModel, AbstractBaseUser, PermissionsMixin):
+class StaffUser(ChangeTrackingMixin, DefaultModel, AbstractBaseUser, PermissionsMixin):
     """
         A model representing a staff user in the system.
 
@@ -249,7 +265,7 @@ class StaffUser(DefaultModel, AbstractBaseUser, PermissionsMixin):
     incharge_roles = models.ManyToManyField(Incharges, blank=True, help_text='Incharge roles held by the staff user.')
 
     # Permissions and other settings
-    role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='STAFF')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='STAFF', db_index=True)
     is_active = models.BooleanField(
         default=True,
         help_text="Indicates whether the user account is active."
@@ -278,10 +294,14 @@ class StaffUser(DefaultModel, AbstractBaseUser, PermissionsMixin):
         """
         return self.email
 
+    @staticmethod
+    def generate_staff_user_id():
+        return str(uuid.uuid4())[:25]
+
     def save(self, *args, **kwargs):
         # Generate unique staff_user_id if not set
         if not self.staff_user_id:
-            self.staff_user_id = str(uuid.uuid4())[:25]
+            self.staff_user_id = self.generate_staff_user_id()
 
         # Set staff status based on role
         if self.role in ['SITE_ADMIN', 'HOSPITAL_ADMIN']:
@@ -364,7 +384,7 @@ class StaffUserEducation(DefaultModel):
         unique_together = ['staff_user', 'program', 'passing_year']
 
 
-class Hospital(DefaultModel):
+class Hospital(ChangeTrackingMixin, DefaultModel):
     """
     Model representing a hospital and its details.
 
@@ -635,9 +655,52 @@ class HospitalMedicalServiceUnit(models.Model):
     contact_number = models.CharField(max_length=15, null=True, blank=True)
     empanelments = models.TextField(null=True, blank=True)
 
+    # live occupancy, only ever changed through atomic F() updates (see occupancy.py)
+    occupied_beds = models.PositiveIntegerField(default=0, help_text='Beds currently occupied.')
+    reserved_beds = models.PositiveIntegerField(default=0, help_text='Beds held by unexpired reservations.')
+
     class Meta:
         unique_together = ('hospital', 'msu')
 
+    @property
+    def free_beds(self):
+        if self.bed_count is None:
+            return None
+        return max(self.bed_count - self.occupied_beds - self.reserved_beds, 0)
+
+
+class BedReservation(DefaultModel):
+    """
+        Model representing a temporary hold on beds of a hospital–MSU pair.
+
+        Attributes:
+            unit (ForeignKey): The hospital–MSU pair the beds belong to.
+            beds (PositiveIntegerField): Number of beds held.
+            status (CharField): Held, confirmed (admitted), released or expired.
+            expires_at (DateTimeField): When an unconfirmed hold lapses.
+            referral (ForeignKey): Optional referral the beds are held for.
+            reserved_by (ForeignKey): Staff user who placed the hold.
+    """
+    STATUS_CHOICES = [
+        ('HELD', 'Held'),
+        ('CONFIRMED', 'Confirmed'),
+        ('RELEASED', 'Released'),
+        ('EXPIRED', 'Expired'),
+    ]
+
+    unit = models.ForeignKey(HospitalMedicalServiceUnit, on_delete=models.CASCADE, related_name='reservations')
+    beds = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='HELD')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(help_text="When an unconfirmed hold lapses.")
+    referral = models.ForeignKey('Referral', on_delete=models.SET_NULL, null=True, blank=True)
+    reserved_by = models.ForeignKey('StaffUser', on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
 
 class HospitalIncharge(models.Model):
     hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE)
@@ -654,13 +717,47 @@ class File(DefaultModel):
 
         Attributes:
             file (FileField): A file to be uploaded, stored in the specified directory.
+            sha256 (CharField): Hash of the content; files assembled from chunked
+                uploads are stored once per distinct content.
+            size (BigIntegerField): Content length in bytes.
+            name (CharField): Original file name of the first upload.
+            content_type (CharField): Media type declared by the uploader.
     """
     file = models.FileField(
         upload_to='file/', null=True, blank=True,
         help_text="A file to be uploaded, stored in the 'file/' directory."
     )
+    sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    size = models.BigIntegerField(null=True, blank=True, editable=False)
+    name = models.CharField(max_length=255, blank=True, default='')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+
+
+class Upload(DefaultModel):
+    """
+        Chunked upload in progress (see ``referral_system_database.uploads``).
 
-class CaseStatus(DefaultModel):
+        Attributes:
+            created_by (ForeignKey): Staff user sending the chunks.
+            filename (CharField): Original file name.
+            content_type (CharField): Media type of the file.
+            size (BigIntegerField): Total length announced when the upload started.
+            received (BigIntegerField): Bytes stored so far; the next chunk starts here.
+            expected_sha256 (CharField): Hash announced by the client, checked on finalize.
+            file (ForeignKey): The stored file once the upload is finalized.
+            expires_at (DateTimeField): Unfinished uploads are discarded after this.
+    """
+    created_by = models.ForeignKey('StaffUser', on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    expected_sha256 = models.CharField(max_length=64, blank=True, default='')
+    file = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploads')
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+class CaseStatus(VersionedModel, DefaultModel):
     CASE_STATUS_CHOICES = [
         ('IN-TRANSIT', 'In Transit'),
         ('RETURN-DISCHARGE', 'Return Discharge'),
@@ -744,7 +841,7 @@ class IntermediatesStatusClass(DefaultModel):
 
 
 
-class Referral(DefaultModel):
+class Referral(ChangeTrackingMixin, DefaultModel):
     """
         Model representing a patient referral process.
     """
@@ -804,7 +901,7 @@ class Referral(DefaultModel):
     transport_mode = models.CharField(
         max_length=40,
         choices=TRANSPORT_MODE_CHOICES,
-        null=True,
+        null=True, db_index=True,
         help_text="Mode of transport used during the referral."
     )
     referred_hospital = models.ForeignKey(
@@ -822,7 +919,7 @@ class Referral(DefaultModel):
         help_text="The hospital from which the patient is referred."
     )
     datetime = models.DateTimeField(
-        default=timezone.now,
+        default=timezone.now, db_index=True,
         help_text="The timestamp of the referral."
     )
     referred_by = models.ForeignKey(
@@ -845,7 +942,7 @@ class Referral(DefaultModel):
     )
 
 
-class CaseFollowUp(DefaultModel):
+class CaseFollowUp(VersionedModel, DefaultModel):
     """
         Model representing a follow-up on a patient case.
     """
@@ -952,6 +1049,36 @@ class CaseFollowUp(DefaultModel):
     )
 
 
+class FollowUpSchedule(models.Model):
+    """
+        When a referral is next due for a follow-up call, and who holds it.
+
+        Recomputed from the referral's calls on every ``CaseFollowUp`` write
+        (see ``referral_system_database.follow_ups``), so the callers' work
+        queue is an index range scan on ``next_call_at``.
+
+        Attributes:
+            referral (OneToOneField): The followed-up referral.
+            next_call_at (DateTimeField): When the next call is due; ``None`` once no more calls are needed.
+            last_call_at (DateTimeField): Time of the latest call.
+            unanswered_calls (PositiveSmallIntegerField): Consecutive unanswered calls.
+            leased_to (ForeignKey): Caller currently working on the referral.
+            lease_expires_at (DateTimeField): When the lease lapses and the referral returns to the queue.
+    """
+    referral = models.OneToOneField(Referral, on_delete=models.CASCADE, primary_key=True, related_name='follow_up_schedule')
+    next_call_at = models.DateTimeField(null=True, blank=True)
+    last_call_at = models.DateTimeField(null=True, blank=True)
+    unanswered_calls = models.PositiveSmallIntegerField(default=0)
+    leased_to = models.ForeignKey(StaffUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_call_at']),
+            models.Index(fields=['leased_to', 'lease_expires_at']),
+        ]
+
+
 class Logging(models.Model):
     """
         Model representing system logs.
@@ -962,6 +1089,7 @@ class Logging(models.Model):
             LogActivity (CharField): A short description of the activity being logged.
             LogData (CharField): Additional data related to the logged activity.
             LogDetails (CharField): Detailed description of the logged event.
+            logged_at (DateTimeField): When the event was logged.
     """
     LoggingID = models.AutoField(primary_key=True)
     LogLevel = models.CharField(
@@ -984,3 +1112,141 @@ class Logging(models.Model):
         default="Log Details",
         help_text="Detailed description of the logged event."
     )
+    logged_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        help_text="When the event was logged."
+    )
+
+
+# Cold storage for the history of closed cases (see referral_system_database.archive).
+ArchivedCaseStatus = archive_model(CaseStatus, 'datetime')
+ArchivedCaseFollowUp = archive_model(CaseFollowUp, 'call_date')
+ArchivedLogging = archive_model(Logging, 'logged_at')
+
+
+class ChangeHistory(models.Model):
+    """
+        Append-only log of changes made to tracked models.
+
+        Attributes:
+            model_label (CharField): ``app_label.model_name`` of the changed object.
+            object_id (CharField): Primary key of the changed object.
+            action (CharField): Create, update or delete.
+            changes (JSONField): ``{field: [old, new]}`` for the changed fields only
+                (the full row for deletes).
+            changed_at (DateTimeField): When the change was committed.
+            changed_by (ForeignKey): Staff user who made the change, if known.
+    """
+    ACTION_CHOICES = [
+        ('CREATE', 'Create'),
+        ('UPDATE', 'Update'),
+        ('DELETE', 'Delete'),
+    ]
+
+    model_label = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(
+        StaffUser, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False, related_name='+'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_label', 'object_id', 'changed_at']),
+        ]
+
+
+class Job(models.Model):
+    """
+        Background job waiting for, or handled by, ``manage.py run_workers``.
+
+        Attributes:
+            name (CharField): Registered task name (see ``referral_system_database.jobs``).
+            payload (JSONField): Keyword arguments the task is called with.
+            priority (SmallIntegerField): Higher runs first.
+            status (CharField): Queued, running, done or failed.
+            run_at (DateTimeField): Earliest time the job may start; pushed back on retry.
+            attempts (PositiveSmallIntegerField): Runs started so far.
+            max_attempts (PositiveSmallIntegerField): Runs allowed before the job fails.
+            locked_by (CharField): Worker currently holding the job.
+            locked_until (DateTimeField): End of the worker's lease; expired leases are reclaimed.
+            last_error (TextField): Traceback of the last failed run.
+            result (JSONField): Return value of the successful run.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    result = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    """
+        Outcome of a write sent with an ``Idempotency-Key`` header (see
+        ``referral_system_database.idempotency``).
+
+        Attributes:
+            key_hash (CharField): SHA-256 of the caller's scope and key.
+            fingerprint (CharField): SHA-256 of the method, path and body the key was first used with.
+            status_code (PositiveSmallIntegerField): Status of the stored response; empty while
+                the first request is still running.
+            content (BinaryField): Body of the stored response.
+            content_type (CharField): ``Content-Type`` of the stored response.
+            location (CharField): ``Location`` header of the stored response, if any.
+            locked_until (DateTimeField): End of the running request's claim; an expired claim
+                (a crashed worker) is taken over by the next retry.
+            expires_at (DateTimeField): When the record is forgotten and the key may be reused.
+    """
+    key_hash = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content = models.BinaryField(default=b'')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    location = models.CharField(max_length=500, blank=True, default='')
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class RegistrySnapshot(models.Model):
+    """
+        Version of the offline registry bundle (see ``referral_system_database.registry``).
+
+        The primary key is the version number field clients sync from.
+
+        Attributes:
+            digest (CharField): SHA-256 of the bundled rows; a rebuild with the same
+                digest keeps the current version.
+            bundle (BinaryField): Gzipped columnar JSON of every registry table.
+            tables (JSONField): Row count per table.
+            created_at (DateTimeField): When the version was built.
+            checked_at (DateTimeField): Last rebuild that found nothing changed.
+    """
+    digest = models.CharField(max_length=64)
+    bundle = models.BinaryField()
+    tables = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    checked_at = models.DateTimeField(default=timezone.now)
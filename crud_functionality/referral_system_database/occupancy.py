@@ -0,0 +1,260 @@
+"""
+Live bed occupancy for hospital–MSU pairs.
+
+Counters on ``HospitalMedicalServiceUnit`` are only changed with conditional
+``UPDATE ... SET x = x + n WHERE <capacity check>`` statements, so concurrent
+admissions never race on a read-modify-write and capacity is enforced by the
+database. Reservations hold beds until they are confirmed, released or expire.
+
+``availability`` is an in-memory snapshot of free beds indexed by MSU, block and
+district. It is patched after every change made through this module and fully
+rebuilt when older than ``BED_SNAPSHOT_MAX_AGE`` seconds, which also picks up
+changes made by other processes. Lapsed holds are expired before every rebuild,
+and by the ``occupancy.expire_reservations`` task (see ``JOB_SCHEDULE``).
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from referral_system_database.models import BedReservation, HospitalMedicalServiceUnit
+
+
+class BedsUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough free beds.'
+    default_code = 'beds_unavailable'
+
+
+class ReservationClosed(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Reservation is no longer held.'
+    default_code = 'reservation_closed'
+
+
+class AvailabilitySnapshot:
+    """
+        Free beds per hospital–MSU pair, indexed for nearby-capacity lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._free = {}  # unit id -> (msu id, hospital id, block id, district id, free beds)
+        self._by_msu = defaultdict(set)  # msu id -> unit ids
+        self._by_block = defaultdict(set)  # (msu id, block id) -> unit ids
+        self._by_district = defaultdict(set)  # (msu id, district id) -> unit ids
+        self._district_free = defaultdict(int)  # (msu id, district id) -> free beds
+        self._block_district = {}
+
+    def _rows(self, queryset):
+        return queryset.filter(bed_count__isnull=False).values_list(
+            'id', 'msu_id', 'hospital_id', 'hospital__block_id', 'hospital__district_id',
+            'bed_count', 'occupied_beds', 'reserved_beds',
+        )
+
+    def _add(self, row):
+        unit_id, msu_id, hospital_id, block_id, district_id, bed_count, occupied, reserved = row
+        free = max(bed_count - occupied - reserved, 0)
+        self._free[unit_id] = (msu_id, hospital_id, block_id, district_id, free)
+        self._by_msu[msu_id].add(unit_id)
+        self._by_block[(msu_id, block_id)].add(unit_id)
+        self._by_district[(msu_id, district_id)].add(unit_id)
+        self._district_free[(msu_id, district_id)] += free
+        if block_id is not None:
+            self._block_district[block_id] = district_id
+
+    def _remove(self, unit_id):
+        entry = self._free.pop(unit_id, None)
+        if entry is None:
+            return
+        msu_id, _, block_id, district_id, free = entry
+        self._by_msu[msu_id].discard(unit_id)
+        self._by_block[(msu_id, block_id)].discard(unit_id)
+        self._by_district[(msu_id, district_id)].discard(unit_id)
+        self._district_free[(msu_id, district_id)] -= free
+
+    def rebuild(self):
+        rows = list(self._rows(HospitalMedicalServiceUnit.objects.all()))
+        with self._lock:
+            self._free.clear()
+            self._by_msu.clear()
+            self._by_block.clear()
+            self._by_district.clear()
+            self._district_free.clear()
+            self._block_district.clear()
+            for row in rows:
+                self._add(row)
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'BED_SNAPSHOT_MAX_AGE', 60)
+        if self._built_at is None or time.monotonic() - self._built_at > max_age:
+            # Lapsed holds on units nobody admits to or reserves would stay reserved otherwise.
+            expire_reservations()
+            self.rebuild()
+
+    def refresh_units(self, unit_ids):
+        """
+            Re-reads the given pairs and patches them into the snapshot.
+        """
+        if self._built_at is None:
+            return
+        rows = list(self._rows(HospitalMedicalServiceUnit.objects.filter(pk__in=unit_ids)))
+        with self._lock:
+            for unit_id in unit_ids:
+                self._remove(unit_id)
+            for row in rows:
+                self._add(row)
+
+    def hospitals_with_free_beds(self, msu_id, min_free=1, block_id=None, district_id=None):
+        """
+            Lists hospitals offering ``msu_id`` with at least ``min_free`` free beds.
+
+            With a block, hospitals in that block come first, then the rest of
+            its district. Only the pairs of that MSU and area are looked at.
+
+            Returns:
+                list: Dicts with ``unit``, ``hospital``, ``free_beds`` and ``same_block``.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if block_id is not None and district_id is None:
+                district_id = self._block_district.get(block_id)
+            if district_id is not None:
+                candidates = self._by_district.get((msu_id, district_id), set())
+            elif block_id is not None:
+                candidates = self._by_block.get((msu_id, block_id), set())
+            else:
+                candidates = self._by_msu.get(msu_id, set())
+            results = []
+            for unit_id in candidates:
+                _, hospital_id, unit_block_id, _, free = self._free[unit_id]
+                if free >= min_free:
+                    results.append({
+                        'unit': unit_id,
+                        'hospital': hospital_id,
+                        'free_beds': free,
+                        'same_block': block_id is not None and unit_block_id == block_id,
+                    })
+        results.sort(key=lambda item: (not item['same_block'], -item['free_beds']))
+        return results
+
+    def district_totals(self, msu_id):
+        self.ensure_fresh()
+        with self._lock:
+            return {
+                district_id: free for (msu, district_id), free in self._district_free.items()
+                if msu == msu_id and self._by_district[(msu, district_id)]
+            }
+
+
+availability = AvailabilitySnapshot()
+
+
+def expire_reservations(unit_ids=None):
+    """
+        Returns beds of lapsed holds to the pool.
+
+        Args:
+            unit_ids (list): Restrict to these pairs; all pairs when ``None``.
+
+        Returns:
+            int: Number of reservations expired.
+    """
+    lapsed = BedReservation.objects.filter(status='HELD', expires_at__lte=timezone.now())
+    if unit_ids is not None:
+        lapsed = lapsed.filter(unit_id__in=unit_ids)
+    expired = 0
+    touched = set()
+    for reservation_id, unit_id, beds in lapsed.values_list('id', 'unit_id', 'beds'):
+        with transaction.atomic():
+            # The status check makes a concurrent confirm/release win cleanly.
+            if BedReservation.objects.filter(pk=reservation_id, status='HELD').update(status='EXPIRED'):
+                HospitalMedicalServiceUnit.objects.filter(pk=unit_id).update(reserved_beds=F('reserved_beds') - beds)
+                expired += 1
+                touched.add(unit_id)
+    if touched:
+        availability.refresh_units(touched)
+    return expired
+
+
+def _capacity_filter(unit_id, beds):
+    return HospitalMedicalServiceUnit.objects.filter(
+        pk=unit_id,
+        bed_count__gte=F('occupied_beds') + F('reserved_beds') + beds,
+    )
+
+
+def admit(unit_id, beds=1):
+    expire_reservations([unit_id])
+    if not _capacity_filter(unit_id, beds).update(occupied_beds=F('occupied_beds') + beds):
+        raise BedsUnavailable()
+    availability.refresh_units([unit_id])
+
+
+def discharge(unit_id, beds=1):
+    updated = HospitalMedicalServiceUnit.objects.filter(pk=unit_id, occupied_beds__gte=beds).update(
+        occupied_beds=F('occupied_beds') - beds
+    )
+    if not updated:
+        raise BedsUnavailable('Fewer beds are occupied than discharged.')
+    availability.refresh_units([unit_id])
+
+
+def reserve(unit_id, beds=1, hold_minutes=None, referral=None, reserved_by=None):
+    """
+        Holds ``beds`` on a pair until confirmed, released or expired.
+
+        Returns:
+            BedReservation: The created hold.
+    """
+    hold_minutes = hold_minutes or getattr(settings, 'BED_HOLD_MINUTES', 30)
+    expire_reservations([unit_id])
+    with transaction.atomic():
+        if not _capacity_filter(unit_id, beds).update(reserved_beds=F('reserved_beds') + beds):
+            raise BedsUnavailable()
+        reservation = BedReservation.objects.create(
+            unit_id=unit_id, beds=beds, referral=referral, reserved_by=reserved_by,
+            expires_at=timezone.now() + timedelta(minutes=hold_minutes),
+        )
+    availability.refresh_units([unit_id])
+    return reservation
+
+
+def confirm(reservation):
+    """
+        Turns a held reservation into an admission.
+    """
+    with transaction.atomic():
+        held = BedReservation.objects.filter(pk=reservation.pk, status='HELD', expires_at__gt=timezone.now())
+        if not held.update(status='CONFIRMED'):
+            raise ReservationClosed()
+        HospitalMedicalServiceUnit.objects.filter(pk=reservation.unit_id).update(
+            reserved_beds=F('reserved_beds') - reservation.beds,
+            occupied_beds=F('occupied_beds') + reservation.beds,
+        )
+    reservation.status = 'CONFIRMED'
+    availability.refresh_units([reservation.unit_id])
+
+
+def release(reservation):
+    with transaction.atomic():
+        if not BedReservation.objects.filter(pk=reservation.pk, status='HELD').update(status='RELEASED'):
+            raise ReservationClosed()
+        HospitalMedicalServiceUnit.objects.filter(pk=reservation.unit_id).update(
+            reserved_beds=F('reserved_beds') - reservation.beds
+        )
+    reservation.status = 'RELEASED'
+    availability.refresh_units([reservation.unit_id])
@@ -0,0 +1,206 @@
+"""
+Bulk onboarding of staff users.
+
+``create_user()`` hashes one password and saves one row at a time, which is
+minutes of single-core work for a district's staff list. Here the whole batch
+is validated first, references (work role, speciality, place of posting,
+experts, incharge roles) are resolved with one query per master table,
+passwords are hashed across a process pool, and users and their many-to-many
+rows are written with ``bulk_create`` in one transaction.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from referral_system_database import history
+from referral_system_database.models import StaffUser, Hospital
+from referral_system_database.creation_models.master_models import WorkRole, Speciality, Incharges
+from referral_system_database.creation_models.medical_models import Expert
+
+# Plain columns copied from an input row when present.
+STAFF_FIELDS = [
+    'full_name', 'salutations', 'mobile_number', 'gender', 'dob', 'blood_group', 'emergency_contact_number',
+    'work_status', 'service_joining_year', 'service_status', 'unit_incharge', 'unit_nursing_incharge', 'role',
+]
+
+# Foreign keys given by name: column -> (model, natural key field, model field).
+STAFF_REFERENCES = {
+    'work_role': (WorkRole, 'name', 'work_role'),
+    'speciality': (Speciality, 'name', 'speciality'),
+    'place_of_posting': (Hospital, 'hospital_id', 'place_of_posting'),
+}
+
+# Many-to-many columns holding ``;``-separated names: column -> (model, natural key field).
+STAFF_M2M = {
+    'expert': (Expert, 'expert_name'),
+    'incharge_roles': (Incharges, 'name'),
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+@dataclass
+class OnboardingReport:
+    read: int = 0
+    created: int = 0
+    rejected: list = field(default_factory=list)
+    seconds: float = 0.0
+    hash_seconds: float = 0.0
+
+    @property
+    def users_per_second(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+
+def _names(value):
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or '').split(';') if item.strip()]
+
+
+def _lookup(model, key, values):
+    """
+        Maps lower-cased natural keys to primary keys with one query.
+    """
+    values = {value.lower() for value in values}
+    if not values:
+        return {}
+    return dict(
+        model.objects.annotate(natural_key=Lower(key)).filter(natural_key__in=values).values_list('natural_key', 'pk')
+    )
+
+
+def _hash_chunk(passwords):
+    return [make_password(password or None) for password in passwords]
+
+
+def hash_passwords(passwords, workers=1, chunk_size=16):
+    """
+        Hashes passwords with the configured hasher, across ``workers`` processes.
+
+        Empty passwords become unusable ones, as with ``set_password(None)``.
+    """
+    chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        hashed = map(_hash_chunk, chunks)
+    else:
+        # Forked workers inherit the configured settings and hashers.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            hashed = list(pool.map(_hash_chunk, chunks))
+    return [password for chunk in hashed for password in chunk]
+
+
+def onboard_staff(rows, workers=1, dry_run=False):
+    """
+        Creates staff users from input rows.
+
+        Args:
+            rows (iterable): Dicts with ``email``, ``password``, the columns in
+                ``STAFF_FIELDS``, reference names for ``STAFF_REFERENCES`` and
+                ``;``-separated names (or lists) for ``STAFF_M2M``.
+            workers (int): Processes used to hash passwords.
+            dry_run (bool): Validate and resolve references without writing.
+
+        Returns:
+            OnboardingReport: Counts, rejected rows and timing.
+    """
+    report = OnboardingReport()
+    started = time.perf_counter()
+    rows = list(enumerate(rows, start=1))
+    report.read = len(rows)
+
+    emails = {StaffUser.objects.normalize_email(str(raw.get('email') or '').strip()).lower() for _, raw in rows}
+    existing = set(
+        StaffUser.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+        .values_list('email_lower', flat=True)
+    )
+    references = {
+        column: _lookup(model, key, [str(raw[column]).strip() for _, raw in rows if raw.get(column)])
+        for column, (model, key, _) in STAFF_REFERENCES.items()
+    }
+    m2m = {
+        column: _lookup(model, key, [name for _, raw in rows for name in _names(raw.get(column))])
+        for column, (model, key) in STAFF_M2M.items()
+    }
+
+    valid, seen = [], set()
+    for line, raw in rows:
+        email = StaffUser.objects.normalize_email(str(raw.get('email') or '').strip())
+        errors = []
+        if not email:
+            errors.append('email is required')
+        elif email.lower() in existing:
+            errors.append('email already registered')
+        elif email.lower() in seen:
+            errors.append('email repeated in this batch')
+        values = {}
+        for name in STAFF_FIELDS:
+            value = raw.get(name)
+            value = value.strip() if isinstance(value, str) else value
+            if value in (None, ''):
+                continue
+            model_field = StaffUser._meta.get_field(name)
+            if isinstance(value, str) and model_field.get_internal_type() == 'BooleanField':
+                value = value.lower() in TRUE_VALUES
+            try:
+                # Conversion, choices and max length, as full_clean() would check them.
+                values[name] = model_field.clean(value, None)
+            except ValidationError as error:
+                errors.append(f"{name}: {' '.join(error.messages)}")
+        for column, (_, _, model_field) in STAFF_REFERENCES.items():
+            name = str(raw.get(column) or '').strip()
+            if name:
+                pk = references[column].get(name.lower())
+                if pk is None:
+                    errors.append(f'unknown {column} {name}')
+                values[f'{model_field}_id'] = pk
+        related = {}
+        for column in STAFF_M2M:
+            names = _names(raw.get(column))
+            unknown = [name for name in names if name.lower() not in m2m[column]]
+            if unknown:
+                errors.append(f"unknown {column} {', '.join(unknown)}")
+            related[column] = {m2m[column][name.lower()] for name in names if name.lower() in m2m[column]}
+        if errors:
+            report.rejected.append((line, '; '.join(errors)))
+            continue
+        seen.add(email.lower())
+        valid.append((email, raw.get('password'), values, related))
+
+    if dry_run or not valid:
+        report.seconds = time.perf_counter() - started
+        return report
+
+    hash_started = time.perf_counter()
+    passwords = hash_passwords([password for _, password, _, _ in valid], workers)
+    report.hash_seconds = time.perf_counter() - hash_started
+
+    users = []
+    for (email, _, values, _), password in zip(valid, passwords):
+        user = StaffUser(email=email, password=password, **values)
+        # What StaffUser.save() would have done per row.
+        user.staff_user_id = StaffUser.generate_staff_user_id()
+        user.is_staff = user.role in ('SITE_ADMIN', 'HOSPITAL_ADMIN')
+        users.append(user)
+
+    with history.history_batch(), transaction.atomic():
+        StaffUser.objects.bulk_create(users, batch_size=500)
+        for column in STAFF_M2M:
+            m2m_field = StaffUser._meta.get_field(column)
+            source, target = f'{m2m_field.m2m_field_name()}_id', f'{m2m_field.m2m_reverse_field_name()}_id'
+            links = [
+                m2m_field.remote_field.through(**{source: user.pk, target: pk})
+                for user, (_, _, _, related) in zip(users, valid) for pk in related[column]
+            ]
+            m2m_field.remote_field.through.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+        for user in users:
+            history.record(user, 'CREATE', history.creation_changes(user))
+    report.created = len(users)
+    report.seconds = time.perf_counter() - started
+    return report
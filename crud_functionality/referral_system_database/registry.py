@@ -0,0 +1,247 @@
+"""
+Offline registry bundles: the hospital directory, MSUs, locations and master
+lookups in one download for field clients.
+
+``build_snapshot`` reads every table in ``REGISTRY_TABLES`` into a columnar
+JSON document (per table, the column names and one list of values per column)
+and stores it gzipped as a new ``RegistrySnapshot`` version, unless nothing
+changed since the latest one. ``diff_bundle`` compares two versions row by row
+and returns only the upserted rows and deleted ids per table, so a client that
+holds version ``N`` downloads the delta to the latest version instead of the
+whole registry. Both kinds of bundle never change once built and are served
+with long-lived caching headers; only the manifest naming the latest version is
+revalidated.
+
+Bundles look like::
+
+    {"format": 1, "kind": "snapshot", "version": 7, "created_at": "...",
+     "tables": {"hospital": {"columns": ["id", ...], "data": [[...], ...]}, ...}}
+
+    {"format": 1, "kind": "diff", "from": 5, "version": 7, "created_at": "...",
+     "tables": {"hospital": {"columns": [...], "data": [[...], ...], "deleted": [...],
+                             "replace": false}, ...}}
+
+``replace`` is set when a table's columns changed; the client then drops the
+table's rows and loads ``data`` as its full content.
+
+Versions are built by the ``registry.snapshot`` task, which ``run_workers``
+queues every ``JOB_SCHEDULE`` interval, or by the ``build_registry_snapshot``
+command; the manifest only reads the latest stored one. Builds hold an
+``add()``-based lock in the response cache, so with a shared cache backend
+workers of different processes never store the same tables twice.
+"""
+import gzip
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from crud_functionality import compression
+from referral_system_database.cache import get_or_compute, response_cache
+from referral_system_database.creation_models.master_models import (
+    HospitalType, WorkRole, Employer, ServiceCadre, Speciality, ExpertKeyword, TrainingProvider, Position, Incharges,
+    CertificationProvider, ClinicalPrivilege, Empanelments,
+)
+from referral_system_database.creation_models.medical_models import MedicalCondition
+from referral_system_database.models import (
+    State, District, Block, MedicalServiceUnit, Hospital, HospitalMedicalServiceUnit, RegistrySnapshot,
+)
+
+FORMAT = 1
+
+# Bundles of a version never change.
+IMMUTABLE = 'private, max-age=31536000, immutable'
+
+# Table name -> (model, columns left out). Live bed counters change by the minute
+# and are served by /bed-availability/ instead.
+REGISTRY_TABLES = {
+    'state': (State, ()),
+    'district': (District, ()),
+    'block': (Block, ()),
+    'hospital_type': (HospitalType, ()),
+    'work_role': (WorkRole, ()),
+    'employer': (Employer, ()),
+    'service_cadre': (ServiceCadre, ()),
+    'speciality': (Speciality, ()),
+    'expert_keyword': (ExpertKeyword, ()),
+    'training_provider': (TrainingProvider, ()),
+    'position': (Position, ()),
+    'incharges': (Incharges, ()),
+    'certification_provider': (CertificationProvider, ()),
+    'clinical_privilege': (ClinicalPrivilege, ()),
+    'empanelments': (Empanelments, ()),
+    'medical_condition': (MedicalCondition, ()),
+    'medical_service_unit': (MedicalServiceUnit, ()),
+    'hospital': (Hospital, ()),
+    'hospital_msu': (HospitalMedicalServiceUnit, ('occupied_beds', 'reserved_beds')),
+}
+
+BUILD_LOCK_KEY = 'registry-build:lock'
+BUILD_LOCK_TIMEOUT = 600  # seconds; a lock left by a crashed build is taken over after this long
+BUILD_LOCK_POLL_INTERVAL = 0.5
+
+
+def _columns(model, exclude):
+    pk = model._meta.pk.attname
+    return [pk] + [
+        field.attname for field in model._meta.concrete_fields if field.attname != pk and field.attname not in exclude
+    ]
+
+
+def read_tables():
+    """
+        Reads the registry tables as rows of JSON values, ordered by primary key.
+
+        Returns:
+            dict: Table name to ``(columns, rows)``.
+    """
+    tables = {}
+    for name, (model, exclude) in REGISTRY_TABLES.items():
+        columns = _columns(model, exclude)
+        rows = list(model.objects.order_by('pk').values_list(*columns))
+        # Round-trip through JSON so rows compare equal to the ones decoded from stored bundles.
+        tables[name] = (columns, json.loads(json.dumps(rows, cls=DjangoJSONEncoder)))
+    return tables
+
+
+def _columnar(columns, rows):
+    return {'columns': columns, 'data': [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]}
+
+
+def _rows(table):
+    return [list(row) for row in zip(*table['data'])]
+
+
+def encode(document):
+    payload = json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return gzip.compress(payload, compresslevel=getattr(settings, 'REGISTRY_GZIP_LEVEL', 9), mtime=0)
+
+
+def decode(bundle):
+    return json.loads(gzip.decompress(bundle))
+
+
+def latest_snapshot():
+    return RegistrySnapshot.objects.order_by('-pk').first()
+
+
+def build_snapshot():
+    """
+        Stores the registry as a new version if it changed since the latest one.
+
+        A build running elsewhere is waited for first, so it is compared against
+        the version that build stored.
+
+        Returns:
+            tuple: ``(snapshot, created)``.
+    """
+    cache = response_cache()
+    deadline = time.monotonic() + BUILD_LOCK_TIMEOUT
+    while not cache.add(BUILD_LOCK_KEY, 1, BUILD_LOCK_TIMEOUT) and time.monotonic() < deadline:
+        time.sleep(BUILD_LOCK_POLL_INTERVAL)
+    try:
+        tables = read_tables()
+        columnar = {name: _columnar(columns, rows) for name, (columns, rows) in tables.items()}
+        digest = hashlib.sha256(json.dumps(columnar, separators=(',', ':')).encode()).hexdigest()
+        latest = latest_snapshot()
+        now = timezone.now()
+        if latest is not None and latest.digest == digest:
+            RegistrySnapshot.objects.filter(pk=latest.pk).update(checked_at=now)
+            latest.checked_at = now
+            return latest, False
+
+        with transaction.atomic():
+            snapshot = RegistrySnapshot.objects.create(
+                digest=digest, bundle=b'', tables={name: len(rows) for name, (_, rows) in tables.items()},
+                created_at=now, checked_at=now,
+            )
+            snapshot.bundle = encode({
+                'format': FORMAT, 'kind': 'snapshot', 'version': snapshot.pk, 'created_at': now, 'tables': columnar,
+            })
+            snapshot.save(update_fields=['bundle'])
+        keep = getattr(settings, 'REGISTRY_KEEP_VERSIONS', 30)
+        stale = RegistrySnapshot.objects.order_by('-pk').values_list('pk', flat=True)[keep:]
+        RegistrySnapshot.objects.filter(pk__in=list(stale)).delete()
+        return snapshot, True
+    finally:
+        cache.delete(BUILD_LOCK_KEY)
+
+
+def current_snapshot():
+    """
+        Returns the latest stored version, building the first one if there is none yet.
+    """
+    latest = latest_snapshot()
+    if latest is None:
+        latest, _ = build_snapshot()
+    return latest
+
+
+def _diff(old, new):
+    tables = {}
+    for name, table in new['tables'].items():
+        previous = old['tables'].get(name)
+        if previous is None or previous['columns'] != table['columns']:
+            tables[name] = {**table, 'deleted': [], 'replace': True}
+            continue
+        before = {row[0]: row for row in _rows(previous)}
+        rows = _rows(table)
+        upserts = [row for row in rows if before.get(row[0]) != row]
+        current = {row[0] for row in rows}
+        tables[name] = {
+            **_columnar(table['columns'], upserts),
+            'deleted': [pk for pk in before if pk not in current],
+            'replace': False,
+        }
+    for name in old['tables'].keys() - new['tables'].keys():
+        tables[name] = {'columns': [], 'data': [], 'deleted': [], 'replace': True}
+    return tables
+
+
+def diff_bundle(old, new):
+    """
+        Returns the gzipped diff bundle taking a client from ``old`` to ``new``.
+
+        Computed once per pair of versions and kept in the response cache.
+
+        Args:
+            old (RegistrySnapshot): The version the client holds.
+            new (RegistrySnapshot): The version to reach.
+    """
+    def compute():
+        return encode({
+            'format': FORMAT, 'kind': 'diff', 'from': old.pk, 'version': new.pk, 'created_at': new.created_at,
+            'tables': _diff(decode(old.bundle), decode(new.bundle)),
+        })
+
+    bundle, _ = get_or_compute(f'registry-diff:{old.pk}:{new.pk}:{old.digest}:{new.digest}', compute)
+    return bundle
+
+
+def not_modified(request, etag):
+    return etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+
+
+def bundle_response(request, bundle, etag, cache_control=IMMUTABLE):
+    """
+        Serves a stored bundle: as is with ``Content-Encoding: gzip`` when the client
+        accepts it, decompressed otherwise.
+    """
+    if not_modified(request, etag):
+        response = HttpResponse(status=304)
+    elif compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING'), ['gzip']):
+        response = HttpResponse(bundle, content_type='application/json')
+        compression.mark_encoded(response, 'gzip')
+    else:
+        response = HttpResponse(gzip.decompress(bundle), content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
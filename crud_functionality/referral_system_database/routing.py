@@ -0,0 +1,253 @@
+"""
+Destination recommendations for new referrals.
+
+``routing`` keeps NumPy matrices built from past referrals and their outcomes:
+
+* ``flow[source, destination]``: referrals between two hospitals;
+* ``msu_flow[msu, destination]``: referrals received per medical service unit;
+* ``condition_flow[group, destination]``: referrals received per ICD head group;
+* ``outcomes[msu, destination]`` / ``good_outcomes[msu, destination]``: cases
+  that reached a final status, and those that ended in discharge.
+
+A recommendation is a weighted sum of these rows (each scaled to 0..1), the
+proximity to the source hospital and the free beds in the requested MSU, so it
+costs a handful of vector operations over the hospitals. New referrals and
+final statuses written in this process are added to the flow and outcome
+counts as they happen; everything is rebuilt from the database every
+``ROUTING_REBUILD_SECONDS`` to pick up other processes' writes.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from referral_system_database.models import (
+    ArchivedCaseStatus, CaseStatus, Hospital, HospitalMedicalServiceUnit, MedicalCondition, MedicalServiceUnit,
+    Referral,
+)
+from referral_system_database.occupancy import availability
+
+GOOD_OUTCOMES = ('DISCHARGED',)
+BAD_OUTCOMES = ('DEMISE', 'LAMA', 'DID-NOT-ARRIVE', 'REFERRED')
+
+DEFAULT_WEIGHTS = {
+    'flow': 3.0,
+    'msu': 2.0,
+    'condition': 1.5,
+    'outcome': 2.0,
+    'distance': 2.0,
+    'beds': 1.5,
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _scaled(row):
+    peak = row.max() if row.size else 0
+    return row / peak if peak > 0 else np.zeros_like(row, dtype=np.float64)
+
+
+class RoutingModel:
+    """
+        Hospital-to-hospital referral statistics as dense arrays.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._outcome_seen = {}
+
+    def _index(self, pks):
+        return {pk: index for index, pk in enumerate(pks)}
+
+    def rebuild(self):
+        hospitals = list(Hospital.objects.values_list('pk', 'geo_lat', 'geo_long'))
+        hospital_index = self._index([pk for pk, _, _ in hospitals])
+        msu_index = self._index(MedicalServiceUnit.objects.values_list('pk', flat=True))
+        groups = dict(MedicalCondition.objects.values_list('pk', 'head_name'))
+        group_index = self._index(sorted(set(groups.values())))
+        size, msus = len(hospital_index), len(msu_index)
+
+        latitude = np.array([float(lat) if lat is not None else np.nan for _, lat, _ in hospitals])
+        longitude = np.array([float(lon) if lon is not None else np.nan for _, _, lon in hospitals])
+
+        offers = np.zeros((msus, size), dtype=bool)
+        pairs = [
+            (msu_index[msu_id], hospital_index[hospital_id])
+            for hospital_id, msu_id in HospitalMedicalServiceUnit.objects.values_list('hospital_id', 'msu_id')
+        ]
+        if pairs:
+            offers[tuple(np.array(pairs).T)] = True
+
+        referrals = {}
+        for pk, source_id, destination_id, msu_id in Referral.objects.values_list(
+            'pk', 'source_hospital_id', 'referred_hospital_id', 'medical_Service_Unit_id'
+        ).iterator(chunk_size=5000):
+            referrals[pk] = (hospital_index.get(source_id), hospital_index.get(destination_id), msu_index.get(msu_id))
+
+        # First final status and the case's condition group per referral.
+        final = {}
+        for model in (ArchivedCaseStatus, CaseStatus):
+            rows = model.objects.filter(
+                referral__isnull=False, status__in=GOOD_OUTCOMES + BAD_OUTCOMES,
+            ).order_by('datetime').values_list('referral_id', 'status', 'case_file__medical_condition_id')
+            for referral_id, status, condition_id in rows.iterator(chunk_size=5000):
+                final.setdefault(referral_id, (status in GOOD_OUTCOMES, group_index.get(groups.get(condition_id))))
+
+        flow = np.zeros((size, size), dtype=np.float32)
+        msu_flow = np.zeros((msus, size), dtype=np.float32)
+        condition_flow = np.zeros((len(group_index), size), dtype=np.float32)
+        outcomes = np.zeros((msus, size), dtype=np.float32)
+        good_outcomes = np.zeros((msus, size), dtype=np.float32)
+
+        flow_pairs = [(s, d) for s, d, _ in referrals.values() if s is not None and d is not None]
+        if flow_pairs:
+            np.add.at(flow, tuple(np.array(flow_pairs).T), 1)
+        msu_pairs = [(m, d) for _, d, m in referrals.values() if m is not None and d is not None]
+        if msu_pairs:
+            np.add.at(msu_flow, tuple(np.array(msu_pairs).T), 1)
+        for referral_id, (good, group) in final.items():
+            _, destination, msu = referrals.get(referral_id, (None, None, None))
+            if destination is None:
+                continue
+            if group is not None:
+                condition_flow[group, destination] += 1
+            if msu is not None:
+                outcomes[msu, destination] += 1
+                good_outcomes[msu, destination] += good
+
+        with self._lock:
+            self.hospital_pks = [pk for pk, _, _ in hospitals]
+            self.hospital_index, self.msu_index, self.group_index = hospital_index, msu_index, group_index
+            self.groups = groups
+            self.latitude, self.longitude, self.offers = latitude, longitude, offers
+            self.flow, self.msu_flow, self.condition_flow = flow, msu_flow, condition_flow
+            self.outcomes, self.good_outcomes = outcomes, good_outcomes
+            self._outcome_seen = {referral_id: good for referral_id, (good, _) in final.items()}
+            self._referrals = referrals
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'ROUTING_REBUILD_SECONDS', 3600)
+        if self._built_at is None or time.monotonic() - self._built_at > max_age:
+            self.rebuild()
+
+    def record_referral(self, referral):
+        """
+            Adds a newly created referral to the flow counts.
+        """
+        with self._lock:
+            if self._built_at is None or referral.pk in self._referrals:
+                return
+            source = self.hospital_index.get(referral.source_hospital_id)
+            destination = self.hospital_index.get(referral.referred_hospital_id)
+            msu = self.msu_index.get(referral.medical_Service_Unit_id)
+            self._referrals[referral.pk] = (source, destination, msu)
+            if source is not None and destination is not None:
+                self.flow[source, destination] += 1
+            if msu is not None and destination is not None:
+                self.msu_flow[msu, destination] += 1
+
+    def record_outcome(self, case_status):
+        """
+            Counts a referral's first final status.
+        """
+        if case_status.status not in GOOD_OUTCOMES + BAD_OUTCOMES or not case_status.referral_id:
+            return
+        with self._lock:
+            if self._built_at is None or case_status.referral_id in self._outcome_seen:
+                return
+            _, destination, msu = self._referrals.get(case_status.referral_id, (None, None, None))
+            good = case_status.status in GOOD_OUTCOMES
+            self._outcome_seen[case_status.referral_id] = good
+            if destination is not None and msu is not None:
+                self.outcomes[msu, destination] += 1
+                self.good_outcomes[msu, destination] += good
+
+    def _distances(self, source):
+        lat1, lon1 = np.radians(self.latitude[source]), np.radians(self.longitude[source])
+        lat2, lon2 = np.radians(self.latitude), np.radians(self.longitude)
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    def recommend(self, source_id, msu_id=None, condition_id=None, limit=10):
+        """
+            Ranks destination hospitals for a referral.
+
+            Args:
+                source_id (UUID): Referring hospital.
+                msu_id (UUID): Medical service unit needed; only hospitals offering
+                    it are considered when any do.
+                condition_id (UUID): The case's medical condition.
+                limit (int): Number of hospitals returned.
+
+            Returns:
+                list: Dicts with ``hospital``, ``score``, ``distance_km``,
+                ``free_beds``, ``referrals_from_source`` and ``discharge_rate``.
+        """
+        self.ensure_fresh()
+        weights = {**DEFAULT_WEIGHTS, **getattr(settings, 'ROUTING_WEIGHTS', {})}
+        free_beds = {}
+        if msu_id is not None:
+            for item in availability.hospitals_with_free_beds(msu_id):
+                free_beds[item['hospital']] = free_beds.get(item['hospital'], 0) + item['free_beds']
+
+        with self._lock:
+            size = len(self.hospital_pks)
+            source = self.hospital_index.get(source_id)
+            msu = self.msu_index.get(msu_id)
+            group = self.group_index.get(self.groups.get(condition_id))
+            if size == 0:
+                return []
+
+            score = np.zeros(size)
+            candidates = np.ones(size, dtype=bool)
+            distance = np.full(size, np.nan)
+            flow_row = np.zeros(size)
+            if source is not None:
+                candidates[source] = False
+                flow_row = self.flow[source]
+                score += weights['flow'] * _scaled(flow_row)
+                if not np.isnan(self.latitude[source]):
+                    distance = self._distances(source)
+                    scale = getattr(settings, 'ROUTING_DISTANCE_SCALE_KM', 50)
+                    score += weights['distance'] * np.nan_to_num(np.exp(-distance / scale))
+            discharge_rate = np.full(size, np.nan)
+            if msu is not None:
+                if self.offers[msu].any():
+                    candidates &= self.offers[msu]
+                score += weights['msu'] * _scaled(self.msu_flow[msu])
+                # Laplace-smoothed, so hospitals without history sit at 0.5.
+                rate = (self.good_outcomes[msu] + 1) / (self.outcomes[msu] + 2)
+                score += weights['outcome'] * rate
+                discharge_rate = np.where(
+                    self.outcomes[msu] > 0, self.good_outcomes[msu] / np.maximum(self.outcomes[msu], 1), np.nan
+                )
+            if group is not None:
+                score += weights['condition'] * _scaled(self.condition_flow[group])
+            beds = np.array([free_beds.get(pk, 0) for pk in self.hospital_pks], dtype=np.float64)
+            score += weights['beds'] * np.minimum(beds, 10) / 10
+
+            indices = np.flatnonzero(candidates)
+            if indices.size > limit:
+                indices = indices[np.argpartition(-score[indices], limit - 1)[:limit]]
+            indices = indices[np.argsort(-score[indices], kind='stable')]
+            return [
+                {
+                    'hospital': self.hospital_pks[index],
+                    'score': round(float(score[index]), 4),
+                    'distance_km': None if np.isnan(distance[index]) else round(float(distance[index]), 1),
+                    'free_beds': int(beds[index]),
+                    'referrals_from_source': int(flow_row[index]),
+                    'discharge_rate': None if np.isnan(discharge_rate[index]) else round(float(discharge_rate[index]), 3),
+                }
+                for index in indices
+            ]
+
+
+routing = RoutingModel()
@@ -0,0 +1,211 @@
+"""
+Role-based access scopes.
+
+Every request resolves the caller's scope once: site admins (and superusers)
+see everything, hospital admins and staff see the hospitals they are posted to
+or are incharge of. Scoped viewsets turn the scope into a single ``IN``
+predicate on their hospital columns, so rows outside it never leave the
+database, and staff are read-only on the views listing them in
+``scope_read_only_roles``.
+
+Resolved scopes are cached per access token (``ACCESS_SCOPE_CACHE_ALIAS``) for
+``ACCESS_SCOPE_CACHE_SECONDS``. Keys embed a per-user generation counter that
+is bumped whenever the user's role or posting, or one of their
+``HospitalIncharge`` rows, changes (see ``signals.py``).
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+from referral_system_database.models import HospitalIncharge
+
+# StaffUser fields a scope is derived from.
+SCOPE_FIELDS = {'role', 'place_of_posting', 'is_superuser', 'is_active'}
+
+
+@dataclass(frozen=True)
+class AccessScope:
+    all_hospitals: bool = False
+    hospitals: frozenset = frozenset()
+    read_only: bool = True
+
+    def allows(self, hospital_id):
+        return self.all_hospitals or hospital_id in self.hospitals
+
+    @property
+    def key(self):
+        """
+            Identifies the rows the scope exposes, for sharing cached responses.
+        """
+        if self.all_hospitals:
+            return 'all'
+        return ','.join(sorted(map(str, self.hospitals))) or 'none'
+
+
+NO_ACCESS = AccessScope()
+
+
+def scope_cache():
+    return caches[getattr(settings, 'ACCESS_SCOPE_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(user_id):
+    return f'access-scope-generation:{user_id}'
+
+
+def invalidate_scope(user_id):
+    """
+        Drops every cached scope of a user, whichever token it was cached under.
+    """
+    cache = scope_cache()
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, time.time_ns(), None):
+            cache.incr(key)
+
+
+def resolve_scope(user):
+    """
+        Works out a user's scope from the database.
+
+        Returns:
+            AccessScope: Everything for site admins and superusers; the posting and
+            incharge hospitals otherwise, writable for hospital admins only.
+    """
+    if not user or not user.is_authenticated or not user.is_active:
+        return NO_ACCESS
+    if user.is_superuser or user.role == 'SITE_ADMIN':
+        return AccessScope(all_hospitals=True, read_only=False)
+    hospitals = set(HospitalIncharge.objects.filter(staff_user=user).values_list('hospital_id', flat=True))
+    if user.place_of_posting_id:
+        hospitals.add(user.place_of_posting_id)
+    return AccessScope(hospitals=frozenset(hospitals), read_only=user.role != 'HOSPITAL_ADMIN')
+
+
+def get_scope(request):
+    """
+        Returns the request user's scope, cached per request and per access token.
+    """
+    scope = getattr(request, '_access_scope', None)
+    if scope is not None:
+        return scope
+    user = request.user
+    token_id = request.auth.get('jti') if hasattr(request.auth, 'get') else None
+    if token_id is None or not user.is_authenticated:
+        scope = resolve_scope(user)
+    else:
+        cache = scope_cache()
+        generation_key = _generation_key(user.pk)
+        generation = cache.get(generation_key)
+        if generation is None:
+            cache.add(generation_key, time.time_ns(), None)
+            generation = cache.get(generation_key)
+        key = f'access-scope:{token_id}:{generation}'
+        scope = cache.get(key)
+        if scope is None:
+            scope = resolve_scope(user)
+            cache.set(key, scope, getattr(settings, 'ACCESS_SCOPE_CACHE_SECONDS', 900))
+    request._access_scope = scope
+    return scope
+
+
+def scope_filter(scope, lookups):
+    """
+        Builds the predicate matching rows whose hospital columns fall in ``scope``.
+
+        Args:
+            scope (AccessScope): The caller's scope.
+            lookups (tuple): Paths from the model to hospital ids; a row matches
+                when any of them does.
+
+        Returns:
+            Q: ``None`` when the scope covers every hospital.
+    """
+    if scope.all_hospitals:
+        return None
+    predicate = Q(pk__in=[])
+    for lookup in lookups:
+        predicate |= Q(**{f'{lookup}__in': scope.hospitals})
+    return predicate
+
+
+def _hospital_id(data, lookup):
+    field, *path = lookup.split('__')
+    value = data.get(field)
+    for name in path:
+        value = getattr(value, name, None)
+    return getattr(value, 'pk', None)
+
+
+class ScopedAccessPermission(BasePermission):
+    """
+        Requires an authenticated caller, and a writable scope for unsafe methods
+        unless the caller's role is missing from the view's ``scope_read_only_roles``.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if request.method in SAFE_METHODS:
+            return True
+        scope = get_scope(request)
+        read_only_roles = getattr(view, 'scope_read_only_roles', ('STAFF',))
+        return not scope.read_only or user.role not in read_only_roles
+
+
+class ScopedQuerysetMixin:
+    """
+        Viewset mixin limiting the queryset (and so every lookup, export and
+        history route) to the caller's scope.
+
+        Attributes:
+            scope_lookups (tuple): Paths from the model to hospital ids.
+            scope_read_only_roles (tuple): Roles that may not write through the view.
+    """
+    scope_lookups = ()
+    scope_read_only_roles = ('STAFF',)
+    permission_classes = [ScopedAccessPermission]
+
+    def scope_queryset(self, queryset):
+        predicate = scope_filter(get_scope(self.request), self.scope_lookups)
+        return queryset if predicate is None else queryset.filter(predicate)
+
+    def get_queryset(self):
+        return self.scope_queryset(super().get_queryset())
+
+    def get_archive_queryset(self, using):
+        # ArchiveReadMixin's archived rows keep the same foreign key columns.
+        return self.scope_queryset(super().get_archive_queryset(using))
+
+    def get_cache_scope(self, request):
+        # Callers with the same scope get the same rows, so they share cache entries.
+        return f'scope:{get_scope(request).key}'
+
+    def check_scope_write(self, serializer):
+        scope = get_scope(self.request)
+        if scope.all_hospitals:
+            return
+        lookups = [lookup for lookup in self.scope_lookups if lookup != 'pk']
+        data = serializer.validated_data
+        if serializer.instance is not None and not any(lookup.split('__')[0] in data for lookup in lookups):
+            # get_object() already found the row inside the scope.
+            return
+        hospitals = [_hospital_id(data, lookup) for lookup in lookups]
+        if not any(scope.allows(pk) for pk in hospitals if pk is not None):
+            raise PermissionDenied('The hospitals of this record are outside your scope.')
+
+    def perform_create(self, serializer):
+        self.check_scope_write(serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_scope_write(serializer)
+        super().perform_update(serializer)
@@ -1,14 +1,106 @@
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
-from crud_functionality.referral_system_database.models import Hospital, MedicalServiceUnit
+from crud_functionality.fieldsets import SparseFieldsetsMixin, is_response_root, parse_field_list
+from referral_system_database.history import record_m2m_change
+from referral_system_database.sync import SYNC_MODELS
+from referral_system_database.models import (
+    Hospital, MedicalServiceUnit, HospitalMedicalServiceUnit, BedReservation, Referral, CaseFollowUp,
+    State, District, Block, FollowUpSchedule, File, Upload,
+)
+from referral_system_database.creation_models.master_models import HospitalType
 
-class HospitalSerializer(serializers.ModelSerializer):
+
+class ExpandableFieldsMixin:
+    """
+        Serializer mixin embedding related objects listed in ``?expand=``.
+
+        ``expandable_fields`` maps a field name to the serializer used when it is
+        expanded; unexpanded fields keep their primary key representation.
+        :meth:`get_expansion_plan` tells the view which relations to join or
+        prefetch, so a page costs one query per expanded relation.
+    """
+    expandable_fields = {}
+
+    def get_requested_expansions(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not is_response_root(self):
+            return set()
+        return parse_field_list(request.query_params.get('expand')) & set(self.expandable_fields)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.get_requested_expansions() & set(fields):
+            many = isinstance(fields[name], serializers.ManyRelatedField)
+            fields[name] = self.expandable_fields[name](many=many, read_only=True, source=fields[name].source)
+        return fields
+
+    def get_expansion_plan(self):
+        """
+            Returns the relations to load for the expanded fields.
+
+            Returns:
+                tuple: ``(select_related, prefetch_related)`` lookups.
+        """
+        select_related, prefetch_related = [], []
+        model = self.Meta.model
+        for name, field in self.fields.items():
+            if name not in self.expandable_fields or not isinstance(field, serializers.BaseSerializer):
+                continue
+            model_field = model._meta.get_field(field.source)
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetch_related.append(field.source)
+            else:
+                select_related.append(field.source)
+        return select_related, prefetch_related
+
+
+class StateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = State
+        fields = ['id', 'state_name', 'num_code']
+
+
+class DistrictSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = District
+        fields = ['id', 'district_name', 'district_num_code', 'state']
+
+
+class BlockSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Block
+        fields = ['id', 'block_name', 'block_num_code', 'district']
+
+
+class HospitalTypeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HospitalType
+        fields = ['id', 'name']
+
+
+class MedicalServiceUnitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MedicalServiceUnit
+        fields = ['id', 'msu_name', 'msu_department', 'status']
+
+
+class HospitalSerializer(ExpandableFieldsMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     medical_service_unit = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=MedicalServiceUnit.objects.all(),
         required=False
     )
 
+    expandable_fields = {
+        'state': StateSerializer,
+        'district': DistrictSerializer,
+        'block': BlockSerializer,
+        'hospital_type': HospitalTypeSerializer,
+        'medical_service_unit': MedicalServiceUnitSerializer,
+    }
+
     class Meta:
         model = Hospital
         fields = [
@@ -31,7 +123,124 @@ class HospitalSerializer(serializers.ModelSerializer):
         msu_data = validated_data.pop('medical_service_unit', None)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        changed = instance.changed_fields()
+        if changed is None:
+            instance.save()
+        elif changed:
+            instance.save(update_fields=changed)
         if msu_data is not None:
+            current = list(instance.medical_service_unit.values_list('pk', flat=True))
             instance.medical_service_unit.set(msu_data)
-        return instance
\ No newline at end of file
+            record_m2m_change(instance, 'medical_service_unit', current, [unit.pk for unit in msu_data])
+        return instance
+
+
+class HospitalMedicalServiceUnitSerializer(serializers.ModelSerializer):
+    free_beds = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = HospitalMedicalServiceUnit
+        fields = ['id', 'hospital', 'msu', 'bed_count', 'occupied_beds', 'reserved_beds', 'free_beds']
+        read_only_fields = ['occupied_beds', 'reserved_beds']
+
+
+class BedReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BedReservation
+        fields = ['id', 'unit', 'beds', 'status', 'created_at', 'expires_at', 'referral', 'reserved_by']
+        read_only_fields = fields
+
+
+class BedRequestSerializer(serializers.Serializer):
+    beds = serializers.IntegerField(min_value=1, default=1)
+    hold_minutes = serializers.IntegerField(min_value=1, required=False)
+    referral = serializers.PrimaryKeyRelatedField(queryset=Referral.objects.all(), required=False, allow_null=True)
+
+
+class BedAvailabilityQuerySerializer(serializers.Serializer):
+    msu = serializers.UUIDField()
+    min_free = serializers.IntegerField(min_value=1, default=1)
+    block = serializers.UUIDField(required=False)
+    district = serializers.UUIDField(required=False)
+
+
+class RoutingQuerySerializer(serializers.Serializer):
+    source_hospital = serializers.UUIDField()
+    msu = serializers.UUIDField(required=False)
+    medical_condition = serializers.UUIDField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class ReferralSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Referral
+        fields = '__all__'
+
+
+class CaseFollowUpSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CaseFollowUp
+        fields = '__all__'
+
+
+class FollowUpScheduleSerializer(serializers.ModelSerializer):
+    referral_datetime = serializers.DateTimeField(source='referral.datetime', read_only=True)
+    source_hospital = serializers.PrimaryKeyRelatedField(source='referral.source_hospital', read_only=True)
+    referred_hospital = serializers.PrimaryKeyRelatedField(source='referral.referred_hospital', read_only=True)
+
+    class Meta:
+        model = FollowUpSchedule
+        fields = [
+            'referral', 'referral_datetime', 'source_hospital', 'referred_hospital',
+            'next_call_at', 'last_call_at', 'unanswered_calls', 'lease_expires_at',
+        ]
+
+
+class FollowUpClaimSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class FollowUpReleaseSerializer(serializers.Serializer):
+    referrals = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+
+class FileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = File
+        fields = ['id', 'name', 'content_type', 'size', 'sha256']
+        read_only_fields = fields
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(
+        r'^[0-9a-fA-F]{64}$', source='expected_sha256', required=False, allow_blank=True, write_only=True
+    )
+    offset = serializers.IntegerField(source='received', read_only=True)
+
+    class Meta:
+        model = Upload
+        fields = ['id', 'filename', 'content_type', 'size', 'sha256', 'offset', 'file', 'expires_at']
+        read_only_fields = ['file', 'expires_at']
+
+    def validate_size(self, value):
+        limit = getattr(settings, 'UPLOAD_MAX_SIZE', 512 * 1024 * 1024)
+        if not 0 < value <= limit:
+            raise serializers.ValidationError(f'Size must be between 1 and {limit} bytes.')
+        return value
+
+
+class SyncItemSerializer(serializers.Serializer):
+    model = serializers.ChoiceField(choices=sorted(SYNC_MODELS))
+    id = serializers.UUIDField()
+    version = serializers.IntegerField(min_value=1, required=False, allow_null=True, default=None)
+    data = serializers.DictField()
+
+
+class SyncSerializer(serializers.Serializer):
+    items = SyncItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        limit = getattr(settings, 'SYNC_MAX_ITEMS', 500)
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} items per sync.')
+        return value
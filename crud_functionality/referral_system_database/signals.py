@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from referral_system_database import follow_ups, history, scopes
+from referral_system_database.cache import bump_generation
+from referral_system_database.occupancy import availability
+from referral_system_database.routing import routing
+from referral_system_database.models import (
+    Hospital, HospitalMedicalServiceUnit, MedicalServiceUnit, State, District, Block, Referral, CaseFollowUp,
+    CaseStatus, StaffUser, HospitalIncharge,
+)
+from referral_system_database.creation_models.master_models import HospitalType
+
+# Models embedded in cached responses, directly or through ?expand=.
+CACHED_MODELS = (Hospital, MedicalServiceUnit, HospitalMedicalServiceUnit, State, District, Block, HospitalType)
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generation(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-save-{model._meta.label_lower}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-delete-{model._meta.label_lower}')
+
+
+@receiver(m2m_changed, sender=Hospital.medical_service_unit.through)
+def invalidate_hospital_units(sender, action, **kwargs):
+    # set()/add()/remove() bulk-write the through rows without post_save.
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_generation(HospitalMedicalServiceUnit)
+        availability.invalidate()
+        routing.invalidate()
+
+
+@receiver(post_save, sender=HospitalMedicalServiceUnit)
+@receiver(post_delete, sender=HospitalMedicalServiceUnit)
+def refresh_bed_availability(sender, instance, **kwargs):
+    availability.refresh_units([instance.pk])
+
+
+@receiver(post_save, sender=Hospital)
+def relocate_bed_availability(sender, instance, created, update_fields=None, **kwargs):
+    # Hospitals index the snapshot by block and district.
+    if not created and (update_fields is None or {'block', 'district'} & set(update_fields)):
+        availability.invalidate()
+
+
+def record_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        history.record(instance, 'CREATE', history.creation_changes(instance))
+    else:
+        changes = history.diff(instance, update_fields)
+        if changes:
+            history.record(instance, 'UPDATE', changes)
+    instance.reset_loaded_values()
+
+
+def record_delete(sender, instance, **kwargs):
+    history.record(instance, 'DELETE', history.snapshot(instance))
+
+
+for model in history.TRACKED_MODELS:
+    post_save.connect(record_save, sender=model, dispatch_uid=f'history-save-{model._meta.label_lower}')
+    post_delete.connect(record_delete, sender=model, dispatch_uid=f'history-delete-{model._meta.label_lower}')
+
+
+@receiver(post_save, sender=CaseFollowUp)
+def record_follow_up(sender, instance, **kwargs):
+    # Logging the call ends the caller's lease on the referral.
+    if instance.case_status_id:
+        transaction.on_commit(lambda: follow_ups.reschedule([instance.case_status_id], end_leases=True))
+
+
+@receiver(post_delete, sender=CaseFollowUp)
+def reschedule_follow_up(sender, instance, **kwargs):
+    if instance.case_status_id:
+        transaction.on_commit(lambda: follow_ups.reschedule([instance.case_status_id]))
+
+
+@receiver(pre_save, sender=Referral)
+def note_schedule_change(sender, instance, update_fields=None, **kwargs):
+    # The history receiver forgets the loaded values on post_save, so look before saving.
+    saved = update_fields if update_fields is not None else instance.changed_fields()
+    instance._schedule_changed = saved is None or 'datetime' in saved
+
+
+@receiver(post_save, sender=Referral)
+def schedule_referral(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_schedule_changed', True):
+        transaction.on_commit(lambda: follow_ups.reschedule([instance.pk]))
+
+
+@receiver(post_save, sender=Referral)
+def route_referral(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: routing.record_referral(instance))
+
+
+@receiver(post_save, sender=CaseStatus)
+def route_outcome(sender, instance, **kwargs):
+    transaction.on_commit(lambda: routing.record_outcome(instance))
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def reindex_routing(sender, instance, created=True, **kwargs):
+    # The matrices are indexed by hospital; new and deleted ones need a rebuild.
+    if created:
+        routing.invalidate()
+
+
+@receiver(post_save, sender=StaffUser)
+def invalidate_user_scope(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or scopes.SCOPE_FIELDS & set(update_fields)):
+        scopes.invalidate_scope(instance.pk)
+
+
+@receiver(post_save, sender=HospitalIncharge)
+@receiver(post_delete, sender=HospitalIncharge)
+def invalidate_incharge_scope(sender, instance, **kwargs):
+    scopes.invalidate_scope(instance.staff_user_id)
@@ -0,0 +1,275 @@
+"""
+Batch sync of case follow-ups and case statuses recorded offline.
+
+A client sends every write it queued while offline in one request. Each item
+names the model, the row's client-generated UUID, the fields and, for edits of
+an existing row, the ``version`` the client started from. ``sync_batch``
+applies the whole batch in one transaction with a constant number of queries:
+
+* one ``in_bulk`` per model loads the rows the items refer to,
+* one query per related model checks that the referenced rows exist,
+* new rows go in with ``bulk_create`` and edits with ``bulk_update``.
+
+An edit whose ``version`` is not the stored one is a conflict and returns the
+stored row, so the client can merge and resend. Re-sending a create that was
+already applied (a lost response) matches the stored row and reports
+``unchanged``. Rows whose referral is outside the caller's scope, stored or
+submitted, are ``forbidden`` before either check runs, so neither reveals
+anything about them. Invalid and conflicting items are reported without
+aborting the others.
+
+On SQLite the rows read are not locked, but in WAL mode a transaction whose
+snapshot went stale before its first write fails rather than overwriting, so
+versions are never lost; other backends lock the rows with ``SELECT ... FOR
+UPDATE``.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from referral_system_database import follow_ups
+from referral_system_database.models import CaseFollowUp, CaseStatus, Referral
+from referral_system_database.routing import routing
+
+# Item model name -> (model, field holding the referral the row belongs to).
+SYNC_MODELS = {
+    'case_follow_up': (CaseFollowUp, 'case_status'),
+    'case_status': (CaseStatus, 'referral'),
+}
+
+FORBIDDEN = 'The referral of this row is outside your scope.'
+
+# Columns the client may not set.
+PROTECTED_FIELDS = {'id', 'version'}
+
+
+@dataclass
+class SyncItem:
+    index: int
+    model: str
+    id: object
+    version: int
+    data: dict
+    instance: object = None
+    result: dict = field(default_factory=dict)
+
+    def report(self, status, **extra):
+        self.result = {'status': status, **extra}
+
+
+def row_data(instance):
+    """
+        Returns the row as the client sees it: field names mapped to values, relations as ids.
+    """
+    return {
+        model_field.name: model_field.value_from_object(instance)
+        for model_field in instance._meta.concrete_fields
+    }
+
+
+def _writable_fields(model):
+    return {
+        model_field.name: model_field for model_field in model._meta.concrete_fields
+        if model_field.editable and model_field.name not in PROTECTED_FIELDS
+    }
+
+
+def _apply(item, instance):
+    """
+        Sets the item's fields on ``instance`` and validates them without queries.
+
+        Returns:
+            dict: Errors by field name, empty when the row is valid.
+    """
+    fields = _writable_fields(type(instance))
+    unknown = sorted(set(item.data) - set(fields))
+    if unknown:
+        return {name: ['Unknown or read-only field.'] for name in unknown}
+    errors = {}
+    for name, value in item.data.items():
+        model_field = fields[name]
+        try:
+            if model_field.is_relation:
+                value = None if value is None else model_field.target_field.to_python(value)
+                setattr(instance, model_field.attname, value)
+            else:
+                setattr(instance, model_field.attname, model_field.to_python(value))
+        except ValidationError as error:
+            errors[name] = error.messages
+    relations = [model_field.name for model_field in fields.values() if model_field.is_relation]
+    try:
+        # Related rows are checked in bulk by the caller.
+        instance.clean_fields(exclude=relations + list(errors))
+    except ValidationError as error:
+        errors.update(error.message_dict)
+    return errors
+
+
+def _missing_relations(items):
+    """
+        Finds references to rows that do not exist, one query per related model.
+
+        Returns:
+            dict: Item index to ``{field: [message]}``.
+    """
+    wanted = defaultdict(set)
+    for item in items:
+        for model_field in item.instance._meta.concrete_fields:
+            value = getattr(item.instance, model_field.attname)
+            if model_field.is_relation and value is not None:
+                wanted[model_field.related_model].add(value)
+    existing = {
+        model: set(model._default_manager.filter(pk__in=ids).values_list('pk', flat=True))
+        for model, ids in wanted.items()
+    }
+    missing = {}
+    for item in items:
+        for model_field in item.instance._meta.concrete_fields:
+            value = getattr(item.instance, model_field.attname)
+            if model_field.is_relation and value is not None and value not in existing[model_field.related_model]:
+                message = f'No {model_field.related_model.__name__} {value}.'
+                missing.setdefault(item.index, {})[model_field.name] = [message]
+    return missing
+
+
+def _scope_check(referral_ids, scope):
+    """
+        Looks up the hospitals of ``referral_ids`` in one query.
+
+        Returns:
+            callable: Tells whether a referral id is in ``scope``; rows without a
+                referral are only visible to callers seeing every hospital.
+    """
+    if scope.all_hospitals:
+        return lambda referral_id: True
+    referral_ids = set(referral_ids) - {None}
+    allowed = {
+        pk for pk, source, referred in Referral.objects.filter(pk__in=referral_ids).values_list(
+            'pk', 'source_hospital_id', 'referred_hospital_id',
+        )
+        if scope.allows(source) or scope.allows(referred)
+    } if referral_ids else set()
+    return lambda referral_id: referral_id in allowed
+
+
+def _unchanged(item, current):
+    submitted = type(current)(pk=item.id)
+    if _apply(item, submitted):
+        return False
+    stored, values = row_data(current), row_data(submitted)
+    return all(stored[name] == values[name] for name in item.data)
+
+
+def _save(model, created, updated, batch_size):
+    if created:
+        model.objects.bulk_create(created, batch_size=batch_size)
+    if updated:
+        fields = [*_writable_fields(model), 'version']
+        for model_field in model._meta.concrete_fields:
+            if getattr(model_field, 'auto_now', False):
+                fields.append(model_field.name)
+                for instance in updated:
+                    model_field.pre_save(instance, False)
+        for instance in updated:
+            instance.version += 1
+        model.objects.bulk_update(updated, fields, batch_size=batch_size)
+
+
+def _after_commit(items):
+    # bulk_create()/bulk_update() send no post_save; do what the receivers would.
+    referrals = {
+        item.instance.case_status_id for item in items
+        if item.model == 'case_follow_up' and item.instance.case_status_id
+    }
+    statuses = [item.instance for item in items if item.model == 'case_status']
+    if referrals:
+        follow_ups.reschedule(referrals, end_leases=True)
+    for status in statuses:
+        routing.record_outcome(status)
+
+
+def sync_batch(entries, scope):
+    """
+        Applies a batch of offline writes.
+
+        Args:
+            entries (list): Dicts with ``model``, ``id``, ``version`` (``None`` for new
+                rows) and ``data``, as validated by ``SyncSerializer``.
+            scope (AccessScope): The caller's scope; rows of referrals outside it are rejected.
+
+        Returns:
+            list: One result per entry, in order: ``id``, ``model``, ``status``
+                (``created``, ``updated``, ``unchanged``, ``conflict``, ``invalid`` or
+                ``forbidden``) and the stored ``version``; conflicts carry the stored
+                row as ``current`` and invalid items their ``errors``.
+    """
+    items = [SyncItem(index, **entry) for index, entry in enumerate(entries)]
+    seen = set()
+    for item in items:
+        if (item.model, item.id) in seen:
+            item.report('invalid', errors={'id': ['The same row appears twice in the batch.']})
+        seen.add((item.model, item.id))
+
+    with transaction.atomic():
+        stored = {}
+        for name, (model, _) in SYNC_MODELS.items():
+            ids = [item.id for item in items if item.model == name and not item.result]
+            stored[name] = model.objects.select_for_update().in_bulk(ids) if ids else {}
+
+        # Stored rows outside the caller's scope are reported as forbidden before
+        # anything about them (version, content) can leak through a conflict.
+        visible = _scope_check(
+            [getattr(row, f'{SYNC_MODELS[name][1]}_id') for name, rows in stored.items() for row in rows.values()],
+            scope,
+        )
+        pending = []
+        for item in items:
+            if item.result:
+                continue
+            model, referral_field = SYNC_MODELS[item.model]
+            current = stored[item.model].get(item.id)
+            if current is not None and not visible(getattr(current, f'{referral_field}_id')):
+                item.report('forbidden', errors={'detail': [FORBIDDEN]})
+            elif current is None and item.version is not None:
+                item.report('conflict', version=None, current=None)
+            elif current is not None and item.version is None and _unchanged(item, current):
+                # A create resent after its response was lost.
+                item.report('unchanged', version=current.version)
+            elif current is not None and item.version != current.version:
+                item.report('conflict', version=current.version, current=row_data(current))
+            else:
+                item.instance = current if current is not None else model(pk=item.id)
+                errors = _apply(item, item.instance)
+                if errors:
+                    item.report('invalid', errors=errors)
+                else:
+                    pending.append(item)
+
+        for index, errors in _missing_relations(pending).items():
+            items[index].report('invalid', errors=errors)
+        pending = [item for item in pending if not item.result]
+        target_referral = {item.index: getattr(item.instance, f'{SYNC_MODELS[item.model][1]}_id') for item in pending}
+        allowed = _scope_check(target_referral.values(), scope)
+        for item in pending:
+            if not allowed(target_referral[item.index]):
+                item.report('forbidden', errors={'detail': [FORBIDDEN]})
+        pending = [item for item in pending if not item.result]
+
+        batch_size = getattr(settings, 'SYNC_BULK_BATCH_SIZE', 500)
+        for name, (model, _) in SYNC_MODELS.items():
+            rows = [item for item in pending if item.model == name]
+            _save(
+                model,
+                [item.instance for item in rows if item.version is None],
+                [item.instance for item in rows if item.version is not None],
+                batch_size,
+            )
+        for item in pending:
+            item.report('updated' if item.version is not None else 'created', version=item.instance.version)
+        if pending:
+            transaction.on_commit(lambda: _after_commit(pending))
+
+    return [{'id': item.id, 'model': item.model, **item.result} for item in items]
@@ -0,0 +1,42 @@
+from crud_functionality.database import sync_sqlite_replicas
+from referral_system_database import idempotency, occupancy, registry, uploads
+from referral_system_database.archive import ARCHIVE_POLICIES, archive_history
+from referral_system_database.jobs import task
+from referral_system_database.onboarding import onboard_staff
+
+
+@task('occupancy.expire_reservations')
+def expire_bed_reservations():
+    return {'expired': occupancy.expire_reservations()}
+
+
+@task('database.sync_replicas')
+def sync_replicas(aliases=None):
+    sync_sqlite_replicas(aliases)
+
+
+@task('archive.closed_history')
+def archive_closed_history(horizon_days=None, batch_size=1000):
+    return {kind: archive_history(kind, horizon_days, batch_size).moved for kind in ARCHIVE_POLICIES}
+
+
+@task('staff.onboard')
+def onboard_staff_users(rows, workers=1):
+    report = onboard_staff(rows, workers=workers)
+    return {'created': report.created, 'rejected': report.rejected}
+
+
+@task('idempotency.purge_expired')
+def purge_idempotency_records(batch_size=1000):
+    return {'deleted': idempotency.purge_expired(batch_size)}
+
+
+@task('uploads.purge_expired')
+def purge_expired_uploads():
+    return {'deleted': uploads.purge_expired()}
+
+
+@task('registry.snapshot')
+def build_registry_snapshot():
+    snapshot, created = registry.build_snapshot()
+    return {'version': snapshot.pk, 'created': created}
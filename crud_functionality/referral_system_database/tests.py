@@ -1,3 +1,66 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from referral_system_database.models import State, Hospital, StaffUser, Referral
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminChangelistQueriesTests(TestCase):
+    """
+        The changelists of the large tables run a fixed number of queries, whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = StaffUser.objects.create_superuser(email='admin@example.com', password='password')
+        cls.state = State.objects.create(state_name='State', num_code='1')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = Hospital.objects.count()
+        hospitals = [
+            Hospital.objects.create(hospital_name=f'Hospital {index}', hospital_id=f'H{index}', state=self.state)
+            for index in range(start, start + count)
+        ]
+        for index, hospital in enumerate(hospitals):
+            StaffUser.objects.create_user(
+                email=f'staff{start + index}@example.com', password='password', place_of_posting=hospital,
+            )
+            Referral.objects.create(source_hospital=hospital, referred_hospital=hospitals[0], referred_by=self.admin)
+
+    def assertConstantQueries(self, model_name):
+        url = reverse(f'admin:referral_system_database_{model_name}_changelist')
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(20)
+        with self.assertNumQueries(len(few)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_hospital_changelist(self):
+        self.assertConstantQueries('hospital')
+
+    def test_staff_user_changelist(self):
+        self.assertConstantQueries('staffuser')
+
+    def test_referral_changelist(self):
+        self.assertConstantQueries('referral')
+
+    def test_unfiltered_changelist_uses_estimate(self):
+        self.add_rows(3)
+        url = reverse('admin:referral_system_database_hospital_changelist')
+        with mock.patch('referral_system_database.admin.ESTIMATED_COUNT_THRESHOLD', 1):
+            with CaptureQueriesContext(connection) as unfiltered:
+                response = self.client.get(url)
+            with CaptureQueriesContext(connection) as filtered:
+                self.client.get(url, {'status__exact': '1'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertTrue(any('MAX(rowid)' in query['sql'] for query in unfiltered))
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in unfiltered))
+        self.assertTrue(any('COUNT(*)' in query['sql'] for query in filtered))
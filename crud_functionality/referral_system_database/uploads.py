@@ -0,0 +1,335 @@
+"""
+Resumable chunked uploads of referral attachments, deduplicated by content.
+
+An upload is started with its file name and total size (``start_upload``),
+then sent as consecutive chunks, each tagged with the offset it starts at
+(``write_chunk``). Chunks are streamed to a partial file under
+``UPLOAD_PARTIAL_DIR`` and fed to a SHA-256 hash as they arrive; after a
+dropped connection the client asks for the upload's offset and resumes from
+there. ``finalize_upload`` moves the partial file into storage as a ``File``
+named after its hash, or, when a ``File`` with the same content already
+exists, discards the partial file and returns that one, so a report uploaded
+many times is stored once.
+
+Hash states live in this process (they cannot be stored); a chunk handled by
+another worker, or after a restart, first re-hashes the bytes already on disk.
+
+``serve_file`` answers downloads: single byte ranges with ``206 Partial
+Content``, whole files through ``FileResponse`` (which the WSGI server sends
+with ``sendfile``), or, when ``UPLOAD_SENDFILE_HEADER`` is set, an empty
+response carrying ``X-Accel-Redirect``/``X-Sendfile`` for the web server.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from referral_system_database.models import File, Upload
+
+
+class UploadOffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The chunk does not start at the upload offset.'
+    default_code = 'upload_offset_mismatch'
+
+
+class UploadIncomplete(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The upload has not received all of its bytes.'
+    default_code = 'upload_incomplete'
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The chunk runs past the announced size of the upload.'
+    default_code = 'upload_too_large'
+
+
+class UploadChecksumMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'The uploaded content does not match the announced sha256; the upload was reset.'
+    default_code = 'upload_checksum_mismatch'
+
+
+class _PartialFile(DjangoFile):
+    # FileSystemStorage moves files that have a temporary path instead of copying them.
+    def temporary_file_path(self):
+        return self.name
+
+
+class HashStates:
+    """
+        Running SHA-256 states of the uploads this process is receiving.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._states = OrderedDict()
+        self._locks = {}
+        self._lock = threading.RLock()
+
+    def lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def get(self, upload, offset):
+        """
+            Returns the hash of the first ``offset`` bytes of the upload.
+        """
+        with self._lock:
+            state = self._states.pop(upload.pk, None)
+        if state is not None and state[0] == offset:
+            return state[1]
+        digest = hashlib.sha256()
+        if not offset:
+            return digest
+        remaining = offset
+        with open(partial_path(upload), 'rb') as partial:
+            while remaining:
+                data = partial.read(min(remaining, buffer_size()))
+                if not data:
+                    raise UploadIncomplete('The partial upload on disk is shorter than its offset.')
+                digest.update(data)
+                remaining -= len(data)
+        return digest
+
+    def put(self, upload, offset, digest):
+        with self._lock:
+            self._states[upload.pk] = (offset, digest)
+            self._states.move_to_end(upload.pk)
+            while len(self._states) > self.capacity:
+                self._states.popitem(last=False)
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._states.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+
+
+hash_states = HashStates()
+
+
+def buffer_size():
+    return getattr(settings, 'UPLOAD_BUFFER_SIZE', 64 * 1024)
+
+
+def partial_dir():
+    return getattr(settings, 'UPLOAD_PARTIAL_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'partial')
+
+
+def partial_path(upload):
+    return os.path.join(partial_dir(), f'{upload.pk}.part')
+
+
+def start_upload(user, filename, size, content_type='', sha256=''):
+    """
+        Registers a new upload and creates its empty partial file.
+
+        Returns:
+            Upload: The upload, at offset 0.
+    """
+    upload = Upload.objects.create(
+        created_by=user, filename=filename, size=size, content_type=content_type, expected_sha256=sha256.lower(),
+        expires_at=timezone.now() + timedelta(hours=getattr(settings, 'UPLOAD_EXPIRY_HOURS', 48)),
+    )
+    os.makedirs(partial_dir(), exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+        Appends one chunk to the upload.
+
+        Args:
+            upload (Upload): The upload.
+            offset (int): Position the chunk starts at; must equal ``upload.received``.
+            stream: File-like object the chunk is read from.
+            length (int): Bytes to read from ``stream``.
+
+        Returns:
+            int: The new offset.
+    """
+    if offset + length > upload.size:
+        raise UploadTooLarge()
+
+    with hash_states.lock(upload.pk):
+        # Re-read under the lock: a retried chunk may have just been stored by another request.
+        upload.refresh_from_db(fields=['received', 'file'])
+        if upload.file_id is not None or offset != upload.received:
+            raise UploadOffsetMismatch({'detail': UploadOffsetMismatch.default_detail, 'offset': upload.received})
+        digest = hash_states.get(upload, offset)
+        written = 0
+        with open(partial_path(upload), 'r+b') as partial:
+            # Bytes past the offset are left over from a chunk that never completed.
+            partial.truncate(offset)
+            partial.seek(offset)
+            while written < length:
+                data = stream.read(min(length - written, buffer_size()))
+                if not data:
+                    break
+                partial.write(data)
+                digest.update(data)
+                written += len(data)
+            partial.flush()
+            os.fsync(partial.fileno())
+        if written < length:
+            # The client went away mid-chunk; the offset stays where it was.
+            return offset
+        if not Upload.objects.filter(pk=upload.pk, received=offset, file=None).update(received=offset + written):
+            hash_states.discard(upload.pk)
+            upload.refresh_from_db(fields=['received'])
+            raise UploadOffsetMismatch({'detail': UploadOffsetMismatch.default_detail, 'offset': upload.received})
+        hash_states.put(upload, offset + written, digest)
+    upload.received = offset + written
+    return upload.received
+
+
+def finalize_upload(upload):
+    """
+        Turns a complete upload into a ``File``, reusing the stored one with the same content.
+
+        Returns:
+            tuple: ``(file, created)``.
+    """
+    if upload.file_id is not None:
+        return upload.file, False
+    if upload.received != upload.size:
+        raise UploadIncomplete({'detail': UploadIncomplete.default_detail, 'offset': upload.received})
+
+    path = partial_path(upload)
+    with hash_states.lock(upload.pk):
+        sha256 = hash_states.get(upload, upload.received).hexdigest()
+        if upload.expected_sha256 and upload.expected_sha256 != sha256:
+            open(path, 'wb').close()
+            Upload.objects.filter(pk=upload.pk).update(received=0)
+            upload.received = 0
+            hash_states.discard(upload.pk)
+            raise UploadChecksumMismatch()
+
+        file, created = File.objects.filter(sha256=sha256).first(), False
+        if file is None:
+            file = File(sha256=sha256, size=upload.size, name=upload.filename, content_type=upload.content_type)
+            extension = os.path.splitext(upload.filename)[1].lower()[:10]
+            with open(path, 'rb') as partial:
+                file.file.save(f'{sha256[:2]}/{sha256}{extension}', _PartialFile(partial, name=path), save=False)
+            try:
+                with transaction.atomic():
+                    file.save()
+                created = True
+            except IntegrityError:
+                # Another upload of the same content finished first.
+                file.file.delete(save=False)
+                file = File.objects.get(sha256=sha256)
+        if os.path.exists(path):
+            os.remove(path)
+        upload.file = file
+        upload.save(update_fields=['file'])
+        hash_states.discard(upload.pk)
+    return file, created
+
+
+def purge_expired():
+    """
+        Deletes expired uploads and their partial files.
+
+        Returns:
+            int: Uploads deleted.
+    """
+    expired = list(Upload.objects.filter(expires_at__lte=timezone.now()))
+    for upload in expired:
+        hash_states.discard(upload.pk)
+        if os.path.exists(partial_path(upload)):
+            os.remove(partial_path(upload))
+    return Upload.objects.filter(pk__in=[upload.pk for upload in expired]).delete()[0]
+
+
+def parse_range(header, size):
+    """
+        Parses a single-range ``Range: bytes=...`` header.
+
+        Returns:
+            tuple: ``(start, end)`` inclusive; ``None`` to send the whole file
+                (no header, several ranges or another unit); ``()`` when the
+                range cannot be satisfied.
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return ()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return ()
+    return start, end
+
+
+def _read_range(stored, start, end):
+    with stored.open('rb') as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            data = handle.read(min(remaining, buffer_size()))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def serve_file(request, file):
+    """
+        Builds the download response of a ``File``, honouring ``Range`` and ``If-Range``.
+    """
+    etag = f'"{file.sha256}"' if file.sha256 else None
+    if etag and etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    content_type = file.content_type or 'application/octet-stream'
+    sendfile_header = getattr(settings, 'UPLOAD_SENDFILE_HEADER', None)
+    if sendfile_header:
+        # The web server reads the file itself, ranges included.
+        response = HttpResponse(content_type=content_type)
+        response[sendfile_header] = getattr(settings, 'UPLOAD_SENDFILE_PREFIX', '/protected/') + file.file.name
+    else:
+        size = file.size if file.size is not None else file.file.size
+        if_range = request.headers.get('If-Range')
+        byte_range = parse_range(request.headers.get('Range'), size) if not if_range or if_range == etag else None
+        if byte_range == ():
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(file.file.open('rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(file.file, start, end), status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    if file.name:
+        response['Content-Disposition'] = content_disposition_header(True, file.name)
+    return response
@@ -1,10 +1,23 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from crud_functionality.referral_system_database.views import HospitalViewSet
+from referral_system_database.views import (
+    HospitalViewSet, ReferralViewSet, CaseFollowUpViewSet, BedUnitViewSet, BedReservationViewSet, BedAvailabilityViewSet,
+    FollowUpQueueViewSet, UploadViewSet, FileViewSet, RegistryViewSet, SyncViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'hospitals', HospitalViewSet)
+router.register(r'referrals', ReferralViewSet)
+router.register(r'case-follow-ups', CaseFollowUpViewSet)
+router.register(r'bed-units', BedUnitViewSet)
+router.register(r'bed-reservations', BedReservationViewSet)
+router.register(r'bed-availability', BedAvailabilityViewSet, basename='bed-availability')
+router.register(r'follow-up-queue', FollowUpQueueViewSet, basename='follow-up-queue')
+router.register(r'uploads', UploadViewSet, basename='upload')
+router.register(r'files', FileViewSet)
+router.register(r'registry', RegistryViewSet, basename='registry')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('', include(router.urls)),
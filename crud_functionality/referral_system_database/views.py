@@ -1,8 +1,431 @@
-from rest_framework import viewsets
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from crud_functionality.referral_system_database.models import Hospital
-from crud_functionality.referral_system_database.serializers.model_serializers import HospitalSerializer
+from crud_functionality.fieldsets import SparseFieldsetsViewMixin
+from crud_functionality.filters import FieldFilterBackend
+from crud_functionality.routers import ReplicaReadMixin
+from referral_system_database import follow_ups, occupancy, registry, sync, uploads
+from referral_system_database.archive import ArchiveReadMixin
+from referral_system_database.cache import CachedResponseMixin
+from referral_system_database.exports import ExportMixin
+from referral_system_database.history import ChangeHistoryViewMixin
+from referral_system_database.idempotency import IdempotentWriteMixin
+from referral_system_database.routing import routing
+from referral_system_database.scopes import ScopedAccessPermission, ScopedQuerysetMixin, get_scope, scope_filter
+from referral_system_database.models import (
+    Hospital, HospitalMedicalServiceUnit, MedicalServiceUnit, BedReservation, Referral, CaseFollowUp,
+    State, District, Block, ArchivedCaseFollowUp, File, Upload, RegistrySnapshot,
+)
+from referral_system_database.creation_models.master_models import HospitalType
+from referral_system_database.serializers.model_serializers import (
+    HospitalSerializer, HospitalMedicalServiceUnitSerializer, BedReservationSerializer,
+    BedRequestSerializer, BedAvailabilityQuerySerializer, ReferralSerializer, CaseFollowUpSerializer,
+    FollowUpScheduleSerializer, FollowUpClaimSerializer, FollowUpReleaseSerializer, RoutingQuerySerializer,
+    FileSerializer, UploadSerializer, SyncSerializer,
+)
 
-class HospitalViewSet(viewsets.ModelViewSet):
+class HospitalViewSet(
+    IdempotentWriteMixin, ScopedQuerysetMixin, ChangeHistoryViewMixin, CachedResponseMixin, ExportMixin,
+    SparseFieldsetsViewMixin, ReplicaReadMixin, viewsets.ModelViewSet,
+):
     queryset = Hospital.objects.all()
-    serializer_class = HospitalSerializer
\ No newline at end of file
+    serializer_class = HospitalSerializer
+    scope_lookups = ('pk',)
+    filter_backends = [FieldFilterBackend]
+    filter_fields = [
+        'status', 'setting', 'ownership', 'hospital_type', 'state', 'district', 'block',
+        'higher_facility', 'delivery_point', 'fru', 'sncu', 'nbsu',
+    ]
+    replica_actions = ('list', 'retrieve', 'export')
+    cache_dependencies = (
+        Hospital, MedicalServiceUnit, HospitalMedicalServiceUnit,
+        State, District, Block, HospitalType,
+    )
+    prefetch_fields = ('medical_service_unit',)
+    export_filename = 'hospitals'
+    export_fields = [
+        ('ID', 'id'),
+        ('Hospital ID', 'hospital_id'),
+        ('Hospital Name', 'hospital_name'),
+        ('Hospital Type', 'hospital_type__name'),
+        ('Setting', 'setting'),
+        ('Ownership', 'ownership'),
+        ('Status', 'status'),
+        ('State', 'state__state_name'),
+        ('District', 'district__district_name'),
+        ('Block', 'block__block_name'),
+        ('City/Village', 'city_or_village'),
+        ('Address', 'address'),
+        ('Contact Number', 'contact_number'),
+        ('Email', 'email'),
+        ('Latitude', 'geo_lat'),
+        ('Longitude', 'geo_long'),
+        ('Higher Facility', 'higher_facility'),
+        ('Delivery Point', 'delivery_point'),
+        ('FRU', 'fru'),
+        ('SNCU', 'sncu'),
+        ('NBSU', 'nbsu'),
+    ]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            select_related, prefetch_related = self.get_serializer().get_expansion_plan()
+            queryset = queryset.select_related(*select_related).prefetch_related(*prefetch_related)
+        return queryset
+
+
+class ReferralViewSet(
+    ScopedQuerysetMixin, ChangeHistoryViewMixin, ExportMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet,
+):
+    """
+        Referrals in the caller's scope, for listing, export and their change history.
+    """
+    queryset = Referral.objects.all().order_by('-datetime')
+    serializer_class = ReferralSerializer
+    scope_lookups = ('source_hospital', 'referred_hospital')
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {
+        'source_hospital': ['exact'],
+        'referred_hospital': ['exact'],
+        'medical_Service_Unit': ['exact'],
+        'referred_by': ['exact'],
+        'transport_mode': ['exact'],
+        'datetime': ['gte', 'lte'],
+    }
+    replica_actions = ('list', 'retrieve', 'export')
+    export_filename = 'referrals'
+    export_fields = [
+        ('ID', 'id'),
+        ('Date', 'datetime'),
+        ('Source Hospital', 'source_hospital__hospital_name'),
+        ('Referred Hospital', 'referred_hospital__hospital_name'),
+        ('Medical Service Unit', 'medical_Service_Unit__msu_name'),
+        ('Referred By', 'referred_by__email'),
+        ('Transport Mode', 'transport_mode'),
+        ('Referral Reason', 'referral_reason'),
+        ('Case Notes', 'case_notes'),
+        ('Advance Information Sent', 'advance_information_send'),
+        ('Referred Facility Staff Informed', 'referred_facility_staff_informed'),
+        ('Informed Person', 'referred_facility_staff_informed_person_name'),
+        ('Site Of Demise', 'site_of_demise'),
+    ]
+
+    @action(detail=False)
+    def recommendations(self, request):
+        """
+            Ranks destination hospitals for ``source_hospital`` (and optionally
+            ``msu`` and ``medical_condition``) from past referral flows.
+        """
+        serializer = RoutingQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        return Response(routing.recommend(
+            query['source_hospital'], query.get('msu'), query.get('medical_condition'), query['limit'],
+        ))
+
+
+class CaseFollowUpViewSet(
+    ScopedQuerysetMixin, ArchiveReadMixin, ExportMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet,
+):
+    """
+        Follow-up calls in the caller's scope, for listing and export; callers'
+        clients record them through ``/sync/``.
+    """
+    queryset = CaseFollowUp.objects.all().order_by('-call_date')
+    serializer_class = CaseFollowUpSerializer
+    scope_lookups = ('case_status__source_hospital', 'case_status__referred_hospital')
+    archive_model = ArchivedCaseFollowUp
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {
+        'caller_staff_id': ['exact'],
+        'case_status': ['exact'],
+        'call_answered': ['exact'],
+        'patient_status': ['exact'],
+        'case_location': ['exact'],
+        'call_date': ['gte', 'lte'],
+    }
+    replica_actions = ('list', 'retrieve', 'export')
+    export_filename = 'case-follow-ups'
+    export_fields = [
+        ('ID', 'id'),
+        ('Call Date', 'call_date'),
+        ('Caller', 'caller_staff_id__email'),
+        ('Referral', 'case_status_id'),
+        ('Source Hospital', 'case_status__source_hospital__hospital_name'),
+        ('Referred Hospital', 'case_status__referred_hospital__hospital_name'),
+        ('Call Answered', 'call_answered'),
+        ('Not Answered Reason', 'call_not_answered_reasons'),
+        ('Case Location', 'case_location'),
+        ('Patient Status', 'patient_status'),
+        ('Support Required', 'support_required'),
+        ('Support Notes', 'support_notes'),
+        ('Grievance Reported', 'grievance_reported'),
+        ('Grievance Notes', 'grievance_notes'),
+        ('Call Close Time', 'call_close_time'),
+    ]
+
+
+class BedUnitViewSet(ScopedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = HospitalMedicalServiceUnit.objects.all()
+    serializer_class = HospitalMedicalServiceUnitSerializer
+    scope_lookups = ('hospital',)
+    scope_read_only_roles = ()
+
+    def _bed_request(self, request):
+        serializer = BedRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def _unit_response(self, unit):
+        unit.refresh_from_db()
+        return Response(self.get_serializer(unit).data)
+
+    @action(detail=True, methods=['post'])
+    def admit(self, request, pk=None):
+        unit = self.get_object()
+        occupancy.admit(unit.pk, self._bed_request(request)['beds'])
+        return self._unit_response(unit)
+
+    @action(detail=True, methods=['post'])
+    def discharge(self, request, pk=None):
+        unit = self.get_object()
+        occupancy.discharge(unit.pk, self._bed_request(request)['beds'])
+        return self._unit_response(unit)
+
+    @action(detail=True, methods=['post'])
+    def reserve(self, request, pk=None):
+        unit = self.get_object()
+        data = self._bed_request(request)
+        reservation = occupancy.reserve(
+            unit.pk, data['beds'], data.get('hold_minutes'), data.get('referral'),
+            reserved_by=request.user if request.user.is_authenticated else None,
+        )
+        return Response(BedReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+class BedReservationViewSet(ScopedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = BedReservation.objects.all()
+    serializer_class = BedReservationSerializer
+    scope_lookups = ('unit__hospital',)
+    scope_read_only_roles = ()
+
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        reservation = self.get_object()
+        occupancy.confirm(reservation)
+        return Response(self.get_serializer(reservation).data)
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        reservation = self.get_object()
+        occupancy.release(reservation)
+        return Response(self.get_serializer(reservation).data)
+
+
+class BedAvailabilityViewSet(viewsets.ViewSet):
+    """
+        Hospitals with at least ``min_free`` free beds in an MSU, nearest first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _query(self, request):
+        serializer = BedAvailabilityQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def list(self, request):
+        query = self._query(request)
+        return Response(occupancy.availability.hospitals_with_free_beds(
+            query['msu'], query['min_free'], query.get('block'), query.get('district'),
+        ))
+
+    @action(detail=False)
+    def districts(self, request):
+        query = self._query(request)
+        totals = occupancy.availability.district_totals(query['msu'])
+        return Response([{'district': district, 'free_beds': free} for district, free in totals.items()])
+
+
+class FollowUpQueueViewSet(viewsets.ViewSet):
+    """
+        Follow-up callers' work queue: ``claim`` leases due referrals, ``list``
+        shows the caller's current batch, ``release`` hands referrals back. Only
+        referrals from or to the caller's hospitals are handed out.
+    """
+    permission_classes = [IsAuthenticated]
+    scope_lookups = ('referral__source_hospital', 'referral__referred_hospital')
+
+    def _batch(self, schedules):
+        return Response(FollowUpScheduleSerializer(schedules, many=True).data)
+
+    def _within(self, request):
+        return scope_filter(get_scope(request), self.scope_lookups)
+
+    def list(self, request):
+        return self._batch(follow_ups.leased_calls(request.user, within=self._within(request)))
+
+    @action(detail=False, methods=['post'])
+    def claim(self, request):
+        serializer = FollowUpClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._batch(follow_ups.claim_calls(
+            request.user, serializer.validated_data['limit'], within=self._within(request),
+        ))
+
+    @action(detail=False, methods=['post'])
+    def release(self, request):
+        serializer = FollowUpReleaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        released = follow_ups.release_calls(
+            request.user, serializer.validated_data.get('referrals'), within=self._within(request),
+        )
+        return Response({'released': released})
+
+
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+        Resumable chunked uploads of attachments: ``create`` starts one, ``chunk``
+        (``PUT`` with an ``Upload-Offset`` header and the raw bytes as body) appends
+        to it, ``retrieve`` reports the offset to resume from and ``finalize``
+        stores the file, deduplicated by content.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Upload.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = uploads.start_upload(
+            self.request.user, data['filename'], data['size'], data.get('content_type', ''),
+            data.get('expected_sha256', ''),
+        )
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.query_params.get('offset', '')))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise ParseError('Upload-Offset and Content-Length must be integers.')
+        if length <= 0:
+            raise ParseError('The chunk is empty.')
+        limit = getattr(settings, 'UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 * 1024)
+        if length > limit:
+            raise uploads.UploadTooLarge(f'Chunks are limited to {limit} bytes.')
+        # Read from the raw request stream: the body is never buffered in memory.
+        offset = uploads.write_chunk(upload, offset, request.stream, length)
+        response = Response({'id': upload.pk, 'offset': offset, 'size': upload.size})
+        response['Upload-Offset'] = str(offset)
+        return response
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        file, created = uploads.finalize_upload(self.get_object())
+        return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class FileViewSet(ScopedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+        Attachments of the referrals in the caller's scope, plus the files they
+        uploaded themselves; ``download`` serves the content with byte ranges.
+    """
+    queryset = File.objects.all().order_by('id')
+    serializer_class = FileSerializer
+    scope_lookups = (
+        'attachments_referral_form__source_hospital', 'attachments_referral_form__referred_hospital',
+        'attachments_investigation_reports__source_hospital', 'attachments_investigation_reports__referred_hospital',
+    )
+
+    def scope_queryset(self, queryset):
+        predicate = scope_filter(get_scope(self.request), self.scope_lookups)
+        if predicate is None:
+            return queryset
+        # The joins through both attachment relations repeat rows.
+        return queryset.filter(predicate | Q(uploads__created_by=self.request.user)).distinct()
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        return uploads.serve_file(request, self.get_object())
+
+
+class RegistryViewSet(viewsets.ViewSet):
+    """
+        Offline registry bundles for field clients.
+
+        ``list`` is the manifest: the latest version and, with ``?since=<version>``,
+        the URL of the diff from the client's version. ``retrieve`` serves a full
+        snapshot and ``diff`` (``?from=<version>``) the delta between two versions;
+        both are immutable and cached by clients for good.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _version(self, value, name):
+        try:
+            return RegistrySnapshot.objects.get(pk=int(value))
+        except (TypeError, ValueError):
+            raise ValidationError({name: 'A version number is required.'})
+        except RegistrySnapshot.DoesNotExist:
+            raise NotFound(f'Registry version {value} is no longer available; download the latest snapshot.')
+
+    def list(self, request):
+        snapshot = registry.current_snapshot()
+        since = request.query_params.get('since')
+        etag = f'"registry-{snapshot.pk}-{since or ""}"'
+        if registry.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            diff = None
+            if since and since.isdigit() and int(since) < snapshot.pk and RegistrySnapshot.objects.filter(pk=since).exists():
+                diff = reverse('registry-diff', args=[snapshot.pk], request=request) + f'?from={since}'
+            response = Response({
+                'version': snapshot.pk,
+                'created_at': snapshot.created_at,
+                'tables': snapshot.tables,
+                'size': len(snapshot.bundle),
+                'snapshot': reverse('registry-detail', args=[snapshot.pk], request=request),
+                'diff': diff,
+                'up_to_date': since == str(snapshot.pk),
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def retrieve(self, request, pk=None):
+        snapshot = self._version(pk, 'version')
+        return registry.bundle_response(request, bytes(snapshot.bundle), f'"{snapshot.digest}"')
+
+    @action(detail=True)
+    def diff(self, request, pk=None):
+        new = self._version(pk, 'version')
+        old = self._version(request.query_params.get('from'), 'from')
+        if old.pk >= new.pk:
+            raise ValidationError({'from': 'Must be an older version.'})
+        return registry.bundle_response(request, registry.diff_bundle(old, new), f'"{old.digest[:32]}{new.digest[:32]}"')
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+        Offline-first sync: ``POST`` the case follow-ups and case statuses recorded
+        offline, keyed by client-generated UUIDs, and get one result per item.
+    """
+    permission_classes = [ScopedAccessPermission]
+    scope_read_only_roles = ()
+
+    def create(self, request):
+        serializer = SyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = sync.sync_batch(serializer.validated_data['items'], get_scope(request))
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'counts': counts, 'results': results})
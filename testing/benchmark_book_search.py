@@ -0,0 +1,123 @@
+"""
+Lookup latency of the Book API at catalogue scale.
+
+Fills a scratch SQLite database (same pragma profile as the project) with
+synthetic books, then times ISBN lookups in all three accepted spellings,
+title/author prefix searches and the full ``GET /api/books/?...`` request,
+and prints the query plan of each lookup to show which index it uses.
+
+Usage:
+    python testing/benchmark_book_search.py --books 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'crud_functionality'))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crud_functionality.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES['default']['NAME'] = os.path.join(tempfile.mkdtemp(), 'books.sqlite3')
+settings.ALLOWED_HOSTS = ['*']
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from app.filters import prefix_filter  # noqa: E402
+from app.isbn import normalize_isbn, search_key  # noqa: E402
+from app.models import Book  # noqa: E402
+
+WORDS = (
+    'war peace river night garden stone winter empire shadow silver light ocean city house king queen road '
+    'fire glass iron memory island forest storm machine letter north song tower wolf'
+).split()
+SURNAMES = 'smith patel kumar garcia chen singh brown khan wilson sharma rao iyer murphy ali das'.split()
+
+
+def isbn10(number):
+    body = f'{number:09d}'
+    check = (11 - sum((10 - index) * int(digit) for index, digit in enumerate(body)) % 11) % 11
+    return body + ('X' if check == 10 else str(check))
+
+
+def fill(books, batch=20000):
+    random.seed(7)
+    start = date(1900, 1, 1)
+    for offset in range(0, books, batch):
+        rows = []
+        for number in range(offset, min(offset + batch, books)):
+            book = Book(
+                title=' '.join(random.choices(WORDS, k=3)).title() + f' {number}',
+                author=f'{random.choice(SURNAMES).title()} {random.choice(WORDS).title()}',
+                published_date=start + timedelta(days=random.randrange(45000)),
+                isbn=normalize_isbn(isbn10(number)),
+            )
+            book.fill_lookup_columns()
+            rows.append(book)
+        Book.objects.bulk_create(rows)
+
+
+def timed(label, run, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    print(f'{label:<44} median {statistics.median(samples):7.3f} ms   p95 {samples[int(len(samples) * 0.95) - 1]:7.3f} ms')
+
+
+def plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    started = time.perf_counter()
+    fill(args.books)
+    print(f'{args.books} books loaded in {time.perf_counter() - started:.1f} s')
+
+    target = args.books // 2
+    ten = isbn10(target)
+    hyphenated = f'{ten[0]}-{ten[1:4]}-{ten[4:9]}-{ten[9]}'
+    thirteen = normalize_isbn(ten)
+    book = Book.objects.get(isbn=thirteen)
+    title_prefix = search_key(book.title)[:12]
+    author_prefix = search_key(book.author)
+
+    lookups = [
+        ('isbn, ISBN-13', Book.objects.filter(isbn_normalized=normalize_isbn(thirteen))),
+        ('isbn, ISBN-10', Book.objects.filter(isbn_normalized=normalize_isbn(ten))),
+        ('isbn, hyphenated ISBN-10', Book.objects.filter(isbn_normalized=normalize_isbn(hyphenated))),
+        (f'title prefix {title_prefix!r}, first 10', Book.objects.filter(prefix_filter('title_key', title_prefix)).order_by('title_key')[:10]),
+        (f'author prefix {author_prefix!r}, first 10', Book.objects.filter(prefix_filter('author_key', author_prefix)).order_by('author_key')[:10]),
+    ]
+    for label, queryset in lookups:
+        timed(label, lambda: list(queryset.all()), args.repeat)
+        print(f'    {plan(queryset)}')
+
+    client = APIClient()
+    for query in (f'isbn={hyphenated}', f'title={title_prefix}', f'search={author_prefix}&ordering=title'):
+        timed(f'GET /api/books/?{query}'[:44], lambda: client.get(f'/api/books/?{query}'), max(args.repeat // 4, 10))
+
+
+if __name__ == '__main__':
+    main()
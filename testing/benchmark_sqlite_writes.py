@@ -0,0 +1,91 @@
+"""
+Concurrent write benchmark for the SQLite database profile.
+
+Simulates several gunicorn workers creating referrals while others read, once
+with SQLite's defaults (what the project used before) and once with the pragma
+profile from crud_functionality/database.py. Each worker opens its own
+connection, like a worker process with CONN_MAX_AGE would.
+
+Usage:
+    python testing/benchmark_sqlite_writes.py --workers 8 --writes 500
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'crud_functionality'))
+
+from crud_functionality.database import SQLITE_PRAGMAS  # noqa: E402
+
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def connect(path, pragmas, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    for pragma, value in pragmas.items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
+    return conn
+
+
+def worker(path, pragmas, timeout, writes, results):
+    conn = connect(path, pragmas, timeout)
+    done = locked = 0
+    for _ in range(writes):
+        try:
+            conn.execute('SELECT COUNT(*) FROM referral WHERE hospital = ?', (done % 50,)).fetchone()
+            conn.execute(
+                'INSERT INTO referral (id, hospital, notes) VALUES (?, ?, ?)',
+                (uuid.uuid4().hex, done % 50, 'x' * 200),
+            )
+            done += 1
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+    results.put((done, locked))
+
+
+def run(label, pragmas, workers, writes, timeout):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.sqlite3')
+    conn = connect(path, pragmas, timeout)
+    conn.execute('CREATE TABLE referral (id TEXT PRIMARY KEY, hospital INTEGER, notes TEXT)')
+    conn.execute('CREATE INDEX referral_hospital ON referral (hospital)')
+    conn.close()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(path, pragmas, timeout, writes, results))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    done = sum(item[0] for item in totals)
+    locked = sum(item[1] for item in totals)
+    print(f'{label:<10} {done:>8} writes {locked:>6} locked errors {elapsed:>7.2f}s {done / elapsed:>10.0f} writes/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=500, help='Writes per worker.')
+    parser.add_argument('--timeout', type=float, default=5.0, help='sqlite3 busy timeout in seconds for the default run.')
+    args = parser.parse_args()
+
+    run('default', DEFAULT_PRAGMAS, args.workers, args.writes, args.timeout)
+    run('profile', SQLITE_PRAGMAS, args.workers, args.writes, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Insert and range-scan benchmark for random (UUIDv4) versus time-ordered (UUIDv7) keys.
+
+Builds the same table twice, keyed the way Django stores a UUIDField on SQLite
+(32 hex characters), and inserts rows in creation order like the application
+does. Reports insert throughput for the first and last batch (random keys get
+slower as the primary key index outgrows the page cache), the file size, and
+the time to read the most recent rows by key range, which for v4 keys needs a
+separate index on the creation time.
+
+Usage:
+    python testing/benchmark_uuid_keys.py --rows 2000000
+    python testing/benchmark_uuid_keys.py --rows 2000000 --without-rowid  # clustered layout
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'crud_functionality'))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crud_functionality.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from referral_system_database.default import uuid7  # noqa: E402
+
+
+def build(label, new_id, rows, batch, cache_kib, without_rowid):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{cache_kib}')
+    conn.execute(
+        'CREATE TABLE referral (id char(32) NOT NULL PRIMARY KEY, created_ms integer NOT NULL, notes text)'
+        + (' WITHOUT ROWID' if without_rowid else '')
+    )
+    conn.execute('CREATE INDEX referral_created ON referral (created_ms)')
+
+    rates = []
+    start_ms = 1_700_000_000_000
+    total_start = time.perf_counter()
+    for offset in range(0, rows, batch):
+        values = []
+        for index in range(offset, min(offset + batch, rows)):
+            # One row per millisecond of simulated time.
+            created_ms = start_ms + index
+            values.append((new_id(created_ms).hex, created_ms, 'x' * 120))
+        started = time.perf_counter()
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO referral VALUES (?, ?, ?)', values)
+        conn.execute('COMMIT')
+        rates.append(len(values) / (time.perf_counter() - started))
+    total = time.perf_counter() - total_start
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    # Newest 1% of rows: by key range for v7, by the creation-time index for v4.
+    since_ms = start_ms + rows - rows // 100
+    conn.execute('PRAGMA cache_size = -2000')
+    started = time.perf_counter()
+    if label == 'uuid7':
+        floor = uuid.UUID(int=since_ms << 80).hex
+        found = conn.execute('SELECT COUNT(*), MAX(length(notes)) FROM referral WHERE id >= ?', (floor,)).fetchone()[0]
+    else:
+        found = conn.execute(
+            'SELECT COUNT(*), MAX(length(notes)) FROM referral WHERE created_ms >= ?', (since_ms,)
+        ).fetchone()[0]
+    scan = time.perf_counter() - started
+
+    started = time.perf_counter()
+    conn.execute('SELECT id FROM referral ORDER BY id LIMIT 10 OFFSET ?', (rows // 2,)).fetchall()
+    page = time.perf_counter() - started
+    conn.close()
+
+    size_mb = os.path.getsize(path) / 1e6
+    print(
+        f'{label:<6} {rows:>9} rows  insert {rows / total:>8.0f}/s (first batch {rates[0]:>7.0f}/s, '
+        f'last {rates[-1]:>7.0f}/s)  size {size_mb:>7.1f} MB  newest 1% ({found} rows) {scan * 1000:>7.1f} ms  '
+        f'ORDER BY id page {page * 1000:>6.1f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=50_000, help='Rows inserted per transaction.')
+    parser.add_argument('--cache-kib', type=int, default=16_000, help='SQLite page cache, smaller than the index.')
+    parser.add_argument('--without-rowid', action='store_true', help='Store rows in primary key order.')
+    args = parser.parse_args()
+
+    build('uuid4', lambda created_ms: uuid.uuid4(), args.rows, args.batch, args.cache_kib, args.without_rowid)
+    build('uuid7', uuid7, args.rows, args.batch, args.cache_kib, args.without_rowid)
+
+
+if __name__ == '__main__':
+    main()